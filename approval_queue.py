@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovalQueue:
+    # Status writes are applied in the background so the button handler returns
+    # straight away. Taps that arrive within batch_window are coalesced per page
+    # and written concurrently; a page already queued, in flight or applied within
+    # the last few batch windows is not written twice.
+    def __init__(self, handler, batch_window=0.25, max_concurrency=5, dedupe_window=None):
+        self.handler = handler
+        self.batch_window = batch_window
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Only repeat taps are deduplicated: a page moved back to Done and posted again
+        # must be written again when it is approved again
+        self.dedupe_window = dedupe_window if dedupe_window is not None else 4 * batch_window
+        self.pending = OrderedDict()
+        self.in_flight = {}
+        self.applied = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closing = False
+        self.batches = 0
+        self.writes = 0
+        self.failures = 0
+        self.duplicates = 0
+
+    def submit(self, page_id, status, on_failure=None):
+        # Returns False for a repeat approval, so the caller can skip the UI update
+        if self.closing:
+            return False
+        queued = self.pending.get(page_id, (None, None))[0]
+        self.forget_applied()
+        if status in (queued, self.in_flight.get(page_id), self.applied.get(page_id, (None, None))[0]):
+            self.duplicates += 1
+            return False
+        # A later status for a page still waiting in the batch replaces the earlier one
+        self.pending[page_id] = (status, on_failure)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        self.wakeup.set()
+        return True
+
+    async def _run(self):
+        while self.pending or not self.closing:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            # Give rapid taps a moment to land in the same batch
+            await asyncio.sleep(self.batch_window)
+            batch = list(self.pending.items())
+            self.pending.clear()
+            self.batches += 1
+            await asyncio.gather(*(self._apply(page_id, status, on_failure) for page_id, (status, on_failure) in batch))
+
+    async def _apply(self, page_id, status, on_failure):
+        self.in_flight[page_id] = status
+        try:
+            async with self.semaphore:
+                self.writes += 1
+                success = await self.handler.update_item_status(page_id, status)
+        finally:
+            self.in_flight.pop(page_id, None)
+        if success:
+            self.applied[page_id] = (status, time.monotonic())
+            self.applied.move_to_end(page_id)
+            return
+        # Nothing is recorded for a failed write, so tapping again retries it
+        self.failures += 1
+        if on_failure:
+            try:
+                await on_failure()
+            except Exception as e:
+                logger.error(f"Error rolling back approval of {page_id}: {str(e)}")
+
+    def forget_applied(self):
+        # Entries are kept in the order they were applied, so the expired ones are at the front
+        cutoff = time.monotonic() - self.dedupe_window
+        while self.applied and next(iter(self.applied.values()))[1] < cutoff:
+            self.applied.popitem(last=False)
+
+    def stats(self):
+        return {
+            "pending": len(self.pending) + len(self.in_flight),
+            "batches": self.batches,
+            "writes": self.writes,
+            "failures": self.failures,
+            "duplicates": self.duplicates,
+        }
+
+    async def stop(self, timeout=None):
+        # Apply whatever is still queued before the Notion client closes
+        self.closing = True
+        self.wakeup.set()
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropped {len(self.pending)} queued approvals on shutdown")
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_renderer import render_blocks
+
+BLOCK_TYPES = ['paragraph', 'heading_2', 'bulleted_list_item', 'numbered_list_item', 'to_do', 'quote', 'callout', 'code']
+
+
+def make_block(index):
+    block_type = BLOCK_TYPES[index % len(BLOCK_TYPES)]
+    rich_text = [
+        {"type": "text", "plain_text": f"Block {index} has some <plain> & text. ", "annotations": {}, "href": None},
+        {"type": "text", "plain_text": "bold part", "annotations": {"bold": True}, "href": None},
+        {"type": "text", "plain_text": " and a link", "annotations": {"italic": True}, "href": "https://example.com/?a=1&b=2"},
+    ]
+    data = {"rich_text": rich_text}
+    if block_type == 'callout':
+        data["icon"] = {"type": "emoji", "emoji": "💡"}
+    return {"id": str(index), "type": block_type, "depth": index % 3 if block_type.endswith('list_item') else 0, block_type: data}
+
+
+def bench(blocks, budget, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        output = render_blocks(blocks, budget)
+    elapsed = (time.perf_counter() - start) / rounds
+    return elapsed, len(output)
+
+
+def main():
+    for count in (100, 2000, 10000):
+        blocks = [make_block(index) for index in range(count)]
+        rounds = max(1, 20000 // count)
+        full, full_length = bench(blocks, None, rounds)
+        preview, preview_length = bench(blocks, 1000, rounds)
+        print(f"{count:>6} blocks: full {full * 1000:8.2f} ms ({full_length} chars), "
+              f"preview {preview * 1000:6.3f} ms ({preview_length} chars)")
+
+
+if __name__ == "__main__":
+    main()
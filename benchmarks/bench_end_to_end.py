@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs the bot's real polling job against the fake servers in fake_servers.py.
+# Each size runs in a fresh child process so state, caches and peak memory
+# never leak from one run into the next; the servers stay in this process.
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_child(result_path):
+    import resource
+    import telegram
+    import main
+
+    bot = telegram.Bot(main.TELEGRAM_TOKEN, base_url=main.TELEGRAM_API_BASE_URL)
+    await bot.initialize()
+    main.send_scheduler.start(bot)
+
+    # Time from the start of the cycle until each item has been handed to Telegram
+    latencies = []
+    send = main.route_scheduler.send
+
+    async def timed_send(chat_id, item):
+        delivered = await send(chat_id, item)
+        latencies.append(time.perf_counter() - started)
+        return delivered
+
+    main.route_scheduler.send = timed_send
+    started = time.perf_counter()
+    for poller in main.pollers:
+        await poller.poll()
+    elapsed = time.perf_counter() - started
+
+    await main.send_scheduler.stop()
+    await bot.shutdown()
+    await main.notion_handler.close()
+    main.state_store.close()
+    main.content_cache.close()
+
+    result = {
+        "items": len(latencies),
+        "seconds": elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "notion": main.notion_handler.client.stats(),
+    }
+    with open(result_path, 'w') as result_file:
+        json.dump(result, result_file)
+
+
+async def run_size(args, notion, notion_url, bot_api, bot_url, items):
+    database_id = notion.add_database(items)
+    bot_api.received.clear()
+    with tempfile.TemporaryDirectory() as workdir:
+        result_path = os.path.join(workdir, "result.json")
+        env = dict(
+            os.environ,
+            NOTION_TOKEN="bench",
+            NOTION_DATABASE_ID=database_id,
+            NOTION_API_BASE_URL=notion_url,
+            NOTION_RATE_LIMIT=str(args.notion_rate),
+            MAX_ITEMS_PER_CHECK=str(items),
+            TELEGRAM_BOT_TOKEN="123456:bench",
+            TELEGRAM_CHAT_ID=str(args.chat_id),
+            TELEGRAM_API_BASE_URL=bot_url,
+            TELEGRAM_GLOBAL_RATE=str(args.telegram_rate),
+            TELEGRAM_CHAT_RATE=str(args.telegram_rate),
+            TELEGRAM_GROUP_RATE_PER_MINUTE=str(args.telegram_rate * 60),
+            STATE_DB_PATH=os.path.join(workdir, "state.db"),
+            ROUTES_FILE="",
+            WEBHOOK_URL="",
+            LOG_LEVEL="WARNING",
+        )
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--child", result_path,
+            cwd=workdir, env=env, stdout=asyncio.subprocess.DEVNULL
+        )
+        await process.wait()
+        if process.returncode != 0:
+            raise RuntimeError(f"Benchmark run for {items} items exited with {process.returncode}")
+        with open(result_path) as result_file:
+            return json.load(result_file)
+
+
+async def run(args):
+    from fake_servers import FakeBotAPI, FakeNotion, ServerOptions
+
+    # Injected 429s would otherwise print an access log line each
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+    notion = FakeNotion(
+        ServerOptions(args.notion_latency, args.jitter, args.notion_429, args.retry_after),
+        blocks_per_page=args.blocks_per_page
+    )
+    bot_api = FakeBotAPI(ServerOptions(args.telegram_latency, args.jitter, args.telegram_429, args.retry_after))
+    notion_url = notion.start()
+    bot_url = bot_api.start()
+    try:
+        print(f"Notion latency {args.notion_latency * 1000:.0f} ms, Telegram latency {args.telegram_latency * 1000:.0f} ms, "
+              f"{args.blocks_per_page} blocks per page, 429 ratio {args.notion_429}/{args.telegram_429}")
+        for items in args.sizes:
+            notion_requests = notion.options.requests
+            result = await run_size(args, notion, notion_url, bot_api, bot_url, items)
+            throughput = result["items"] / result["seconds"] if result["seconds"] else 0.0
+            print(f"{items:>6} items: {result['seconds']:8.2f} s, {throughput:8.1f} items/s, "
+                  f"p50 {result['p50'] * 1000:9.1f} ms, p99 {result['p99'] * 1000:9.1f} ms, "
+                  f"peak RSS {result['peak_rss_mb']:6.1f} MB, "
+                  f"{notion.options.requests - notion_requests} Notion requests "
+                  f"({result['notion']['retries']} retried)")
+            if result["items"] != items:
+                # A poller that silently stood by or skipped items would otherwise look like a fast run
+                print(f"        WARNING: {result['items']} of {items} items were delivered")
+    finally:
+        notion.stop()
+        bot_api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of a check cycle against local fake servers")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(',')], default=[10, 100, 10000])
+    parser.add_argument("--notion-latency", type=float, default=0.02)
+    parser.add_argument("--telegram-latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--notion-429", type=float, default=0.0, help="share of Notion requests answered with 429")
+    parser.add_argument("--telegram-429", type=float, default=0.0, help="share of Bot API requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--blocks-per-page", type=int, default=20)
+    parser.add_argument("--notion-rate", type=float, default=1000, help="client-side Notion rate limit")
+    parser.add_argument("--telegram-rate", type=float, default=1000, help="client-side Telegram rate limit")
+    parser.add_argument("--chat-id", type=int, default=1000)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_child(args.child))
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_record import PageRecord
+from search_index import SearchIndex
+
+# Query latency of /search and inline queries against indexes of tens of thousands
+# of pages. Words follow a Zipf-like spread so some appear in most pages and some
+# in a handful, which is what makes the common-word and prefix cases hard.
+TARGET_MS = 10.0
+
+
+def make_vocabulary(size):
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def make_page(rng, index, vocabulary, weights):
+    title = ' '.join(rng.choices(vocabulary, weights, k=4))
+    body = ' '.join(rng.choices(vocabulary, weights, k=rng.randint(40, 200)))
+    return PageRecord(
+        id=f"page-{index}",
+        url=f"https://notion.so/page-{index}",
+        title=title,
+        status="Done",
+        last_edited_time="2026-10-18T10:00:00.000Z",
+        content=f"<p>{body}</p>",
+    )
+
+
+def make_queries(rng, vocabulary):
+    common, rare = vocabulary[:20], vocabulary[-2000:]
+    return {
+        "common word": [rng.choice(common) for _ in range(50)],
+        "rare word": [rng.choice(rare) for _ in range(50)],
+        "two common words": [f"{rng.choice(common)} {rng.choice(common)}" for _ in range(50)],
+        "common + rare": [f"{rng.choice(common)} {rng.choice(rare)}" for _ in range(50)],
+        "prefix (typing)": [f"{rng.choice(common)} {rng.choice(vocabulary[:200])[:3]}" for _ in range(50)],
+    }
+
+
+def bench(index, queries, limit):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search index query latency at tens of thousands of pages")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(',')], default=[10000, 50000])
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(args.vocabulary)
+    # Rank i is drawn with weight 1/(i+1)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    slow = False
+    for size in args.sizes:
+        rng = random.Random(size)
+        index = SearchIndex()
+        start = time.perf_counter()
+        for number in range(size):
+            index.put(make_page(rng, number, vocabulary, weights))
+        built = time.perf_counter() - start
+        print(f"{size:>7} pages: built in {built:.1f}s, {index.stats()['terms']} terms")
+        for name, queries in make_queries(rng, vocabulary).items():
+            # First pass builds the rankings a query needs; the second is steady state
+            first_median, _ = bench(index, queries, args.limit)
+            median, p95 = bench(index, queries, args.limit)
+            print(f"        {name:<18} p50 {median:6.2f} ms  p95 {p95:6.2f} ms  (first pass p50 {first_median:6.2f} ms)")
+            if p95 > TARGET_MS:
+                slow = True
+                print(f"        WARNING: p95 above the {TARGET_MS:.0f} ms target")
+    if slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
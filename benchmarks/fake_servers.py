@@ -0,0 +1,233 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+# In-process stand-ins for the Notion API and the Telegram Bot API. Both answer
+# after a configurable delay and can reply 429 to a share of requests.
+
+SCHEMA = {
+    "Name": {"id": "title", "type": "title", "title": {}},
+    "Status": {"id": "status", "type": "status", "status": {}},
+    "Type": {"id": "type", "type": "select", "select": {}},
+    "Content": {"id": "content", "type": "rich_text", "rich_text": {}},
+    "Author": {"id": "author", "type": "rich_text", "rich_text": {}},
+}
+
+BLOCK_TYPES = ['paragraph', 'heading_2', 'bulleted_list_item', 'numbered_list_item', 'quote', 'to_do']
+
+
+def rich_text(text):
+    return [{
+        "type": "text",
+        "text": {"content": text, "link": None},
+        "plain_text": text,
+        "annotations": {"bold": False, "italic": False, "strikethrough": False, "underline": False, "code": False, "color": "default"},
+        "href": None,
+    }]
+
+
+def make_page(database_id, index, edited):
+    return {
+        "object": "page",
+        "id": str(uuid.uuid4()),
+        "url": f"https://www.notion.so/bench-{index}",
+        "archived": False,
+        "parent": {"type": "database_id", "database_id": database_id},
+        "last_edited_time": edited,
+        "properties": {
+            "Name": {"id": "title", "type": "title", "title": rich_text(f"Benchmark item {index}")},
+            "Status": {"id": "status", "type": "status", "status": {"name": "Done"}},
+            "Type": {"id": "type", "type": "select", "select": {"name": "Quote" if index % 10 == 0 else "Post"}},
+            "Content": {"id": "content", "type": "rich_text", "rich_text": rich_text(f"Quote number {index}")},
+            "Author": {"id": "author", "type": "rich_text", "rich_text": rich_text("Bench")},
+        },
+    }
+
+
+def make_block(index):
+    block_type = BLOCK_TYPES[index % len(BLOCK_TYPES)]
+    text = f"Line {index} of a benchmark page with a little <markup> & some padding to look like prose."
+    return {"object": "block", "id": str(uuid.uuid4()), "type": block_type, "has_children": False, block_type: {"rich_text": rich_text(text)}}
+
+
+def paginate(items, start_cursor, page_size):
+    start = int(start_cursor or 0)
+    end = start + page_size
+    more = end < len(items)
+    return {"object": "list", "results": items[start:end], "has_more": more, "next_cursor": str(end) if more else None}
+
+
+class ServerOptions:
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_ratio=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+
+
+class FakeHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    async def prepare(self):
+        options = self.server.options
+        options.requests += 1
+        delay = options.latency + random.uniform(0, options.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if options.rate_limit_ratio and random.random() < options.rate_limit_ratio:
+            options.rate_limited += 1
+            self.rate_limit()
+
+    def reply(self, body, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+
+class NotionRequestHandler(FakeHandler):
+    def rate_limit(self):
+        self.set_header("Retry-After", str(self.server.options.retry_after))
+        self.reply({"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"}, 429)
+
+
+class NotionDatabaseHandler(NotionRequestHandler):
+    def get(self, database_id):
+        self.reply({"object": "database", "id": database_id, "title": rich_text("Benchmark"), "properties": SCHEMA})
+
+
+class NotionQueryHandler(NotionRequestHandler):
+    def post(self, database_id):
+        body = json.loads(self.request.body or b"{}")
+        pages = self.server.databases.get(database_id, [])
+        since = find_on_or_after(body.get("filter"))
+        if since:
+            pages = [page for page in pages if page["last_edited_time"] >= since]
+        self.reply(paginate(pages, body.get("start_cursor"), body.get("page_size", 100)))
+
+
+class NotionBlocksHandler(NotionRequestHandler):
+    def get(self, block_id):
+        page_size = int(self.get_query_argument("page_size", "100"))
+        self.reply(paginate(self.server.blocks, self.get_query_argument("start_cursor", None), page_size))
+
+
+class NotionPageHandler(NotionRequestHandler):
+    def patch(self, page_id):
+        self.server.updates += 1
+        self.reply({"object": "page", "id": page_id, "properties": json.loads(self.request.body or b"{}").get("properties", {})})
+
+
+def find_on_or_after(query_filter):
+    if not query_filter:
+        return None
+    if "last_edited_time" in query_filter:
+        return query_filter["last_edited_time"].get("on_or_after")
+    for clause in query_filter.get("and", []):
+        since = find_on_or_after(clause)
+        if since:
+            return since
+    return None
+
+
+class FakeNotion:
+    def __init__(self, options=None, blocks_per_page=20):
+        self.options = options or ServerOptions()
+        self.databases = {}
+        self.blocks = [make_block(index) for index in range(blocks_per_page)]
+        self.updates = 0
+        self.server = None
+        self.port = None
+
+    def add_database(self, pages):
+        database_id = str(uuid.uuid4())
+        # Spread edits over the last day, oldest first, as the bot's ascending sort expects
+        start = datetime.now(timezone.utc) - timedelta(days=1)
+        step = timedelta(days=1) / max(pages, 1)
+        self.databases[database_id] = [
+            make_page(database_id, index, (start + step * index).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+            for index in range(pages)
+        ]
+        return database_id
+
+    def application(self):
+        server = dict(server=self)
+        return tornado.web.Application([
+            (r"/v1/databases/([^/]+)/query", NotionQueryHandler, server),
+            (r"/v1/databases/([^/]+)", NotionDatabaseHandler, server),
+            (r"/v1/blocks/([^/]+)/children", NotionBlocksHandler, server),
+            (r"/v1/pages/([^/]+)", NotionPageHandler, server),
+        ])
+
+    def start(self, port=0):
+        self.server, self.port = listen(self.application(), port)
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        self.server.stop()
+
+
+class BotMethodHandler(FakeHandler):
+    def rate_limit(self):
+        retry_after = self.server.options.retry_after
+        self.reply({
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {retry_after}",
+            "parameters": {"retry_after": retry_after},
+        }, 429)
+
+    def post(self, token, method):
+        self.server.calls[method] = self.server.calls.get(method, 0) + 1
+        if method == "getMe":
+            self.reply({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}})
+            return
+        chat_id = int(self.get_body_argument("chat_id", "0"))
+        self.server.received.append(time.perf_counter())
+        if method == "sendMessage":
+            self.server.message_id += 1
+            self.reply({"ok": True, "result": {
+                "message_id": self.server.message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private"},
+                "text": self.get_body_argument("text", ""),
+            }})
+        else:
+            self.reply({"ok": True, "result": True})
+
+
+class FakeBotAPI:
+    def __init__(self, options=None):
+        self.options = options or ServerOptions()
+        self.calls = {}
+        self.received = []
+        self.message_id = 0
+        self.server = None
+        self.port = None
+
+    def application(self):
+        return tornado.web.Application([(r"/bot([^/]+)/([A-Za-z]+)", BotMethodHandler, dict(server=self))])
+
+    def start(self, port=0):
+        self.server, self.port = listen(self.application(), port)
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def stop(self):
+        self.server.stop()
+
+
+def listen(application, port):
+    # Port 0 picks a free port; the bound one is read back from the socket
+    sockets = bind_sockets(port, address="127.0.0.1")
+    server = HTTPServer(application)
+    server.add_sockets(sockets)
+    return server, sockets[0].getsockname()[1]
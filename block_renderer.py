@@ -0,0 +1,204 @@
+import html
+
+ANNOTATION_TAGS = (
+    ('code', 'code'),
+    ('bold', 'b'),
+    ('italic', 'i'),
+    ('underline', 'u'),
+    ('strikethrough', 's'),
+)
+LIST_TYPES = {'bulleted_list_item', 'numbered_list_item', 'to_do'}
+INDENT = '    '
+
+
+def wrap_annotations(text, run):
+    annotations = run.get('annotations') or {}
+    if run.get('type') == 'equation':
+        text = f'<code>{text}</code>'
+    for key, tag in ANNOTATION_TAGS:
+        if annotations.get(key):
+            text = f'<{tag}>{text}</{tag}>'
+    href = run.get('href')
+    if href:
+        text = f'<a href="{html.escape(href, quote=True)}">{text}</a>'
+    return text
+
+
+def render_rich_text(rich_text, limit=None, annotate=True):
+    # Returns (html, visible length, whether the text was cut at the limit)
+    out = []
+    visible = 0
+    cut = False
+    for run in rich_text:
+        text = run.get('plain_text', '')
+        if limit is not None and visible + len(text) > limit:
+            text = text[:max(0, limit - visible)]
+            cut = True
+        if text:
+            escaped = html.escape(text, quote=False)
+            out.append(wrap_annotations(escaped, run) if annotate else escaped)
+            visible += len(text)
+        if cut:
+            break
+    return ''.join(out), visible, cut
+
+
+def render_paragraph(renderer, block, data):
+    renderer.write(block, rich_text=data.get('rich_text', []))
+
+
+def render_heading(renderer, block, data):
+    renderer.write(block, rich_text=data.get('rich_text', []), wrap=('<b>', '</b>'))
+
+
+def render_bulleted_list_item(renderer, block, data):
+    renderer.write(block, prefix='• ', rich_text=data.get('rich_text', []))
+
+
+def render_numbered_list_item(renderer, block, data):
+    number = renderer.numbers.get(block.get('depth', 0), 1)
+    renderer.write(block, prefix=f'{number}. ', rich_text=data.get('rich_text', []))
+
+
+def render_to_do(renderer, block, data):
+    prefix = '☑ ' if data.get('checked') else '☐ '
+    renderer.write(block, prefix=prefix, rich_text=data.get('rich_text', []))
+
+
+def render_toggle(renderer, block, data):
+    renderer.write(block, prefix='▸ ', rich_text=data.get('rich_text', []))
+
+
+def render_quote(renderer, block, data):
+    renderer.write(block, prefix='▎', rich_text=data.get('rich_text', []), wrap=('<i>', '</i>'))
+
+
+def render_callout(renderer, block, data):
+    icon = data.get('icon') or {}
+    prefix = f"{icon['emoji']} " if icon.get('type') == 'emoji' else '💡 '
+    renderer.write(block, prefix=prefix, rich_text=data.get('rich_text', []))
+
+
+def render_code(renderer, block, data):
+    # Telegram does not allow <pre> inside the preview blockquote, so code stays inline
+    renderer.write(block, rich_text=data.get('rich_text', []), wrap=('<code>', '</code>'), annotate=False)
+
+
+def render_equation(renderer, block, data):
+    renderer.write(block, text=data.get('expression', ''), wrap=('<code>', '</code>'))
+
+
+def render_divider(renderer, block, data):
+    renderer.write(block, text='———')
+
+
+def render_bookmark(renderer, block, data):
+    url = data.get('url')
+    if not url:
+        return
+    caption = ''.join(run.get('plain_text', '') for run in data.get('caption', []))
+    renderer.write(block, text=caption or url, wrap=(f'<a href="{html.escape(url, quote=True)}">', '</a>'))
+
+
+BLOCK_RENDERERS = {
+    'paragraph': render_paragraph,
+    'heading_1': render_heading,
+    'heading_2': render_heading,
+    'heading_3': render_heading,
+    'bulleted_list_item': render_bulleted_list_item,
+    'numbered_list_item': render_numbered_list_item,
+    'to_do': render_to_do,
+    'toggle': render_toggle,
+    'quote': render_quote,
+    'callout': render_callout,
+    'code': render_code,
+    'equation': render_equation,
+    'divider': render_divider,
+    'bookmark': render_bookmark,
+    'embed': render_bookmark,
+    'link_preview': render_bookmark,
+}
+
+
+class BlockRenderer:
+    # Turns streamed blocks into Telegram HTML in a single pass. Output is collected as
+    # fragments and joined once; `budget` caps the visible length of the preview.
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.length = 0
+        self.parts = []
+        self.numbers = {}
+        self.previous_type = None
+        self.truncated = False
+
+    @property
+    def exhausted(self):
+        return self.budget is not None and self.length >= self.budget
+
+    def feed(self, block):
+        if self.exhausted:
+            return
+        block_type = block['type']
+        depth = block.get('depth', 0)
+        # Numbered lists restart whenever something else interrupts them at the same depth
+        for level in [level for level in self.numbers if level > depth]:
+            del self.numbers[level]
+        if block_type != 'numbered_list_item':
+            self.numbers.pop(depth, None)
+
+        renderer = BLOCK_RENDERERS.get(block_type)
+        if renderer:
+            renderer(self, block, block.get(block_type, {}))
+        if block_type == 'numbered_list_item':
+            self.numbers[depth] = self.numbers.get(depth, 1) + 1
+
+    def write(self, block, prefix='', rich_text=None, text=None, wrap=('', ''), annotate=True):
+        depth = block.get('depth', 0)
+        indent = INDENT * depth
+        separator = ''
+        if self.parts:
+            grouped = depth > 0 or (block['type'] in LIST_TYPES and self.previous_type in LIST_TYPES)
+            separator = '\n' if grouped else '\n\n'
+        remaining = None
+        if self.budget is not None:
+            remaining = self.budget - self.length - len(separator) - len(indent) - len(prefix)
+
+        if remaining is not None and remaining < 0:
+            # Not even the prefix fits
+            body, visible, cut = '', 0, True
+        elif rich_text is not None:
+            body, visible, cut = render_rich_text(rich_text, remaining, annotate)
+        else:
+            cut = remaining is not None and len(text) > remaining
+            visible_text = text[:remaining] if cut else text
+            body = html.escape(visible_text, quote=False)
+            visible = len(visible_text)
+        if not body and (cut or not prefix):
+            # Empty paragraphs are only spacing in Notion, and a prefix whose text was
+            # cut away entirely ("1. …") is dropped rather than shown bare
+            if cut:
+                if self.parts:
+                    self.parts.append('…')
+                self.truncated = True
+                self.length = self.budget
+            return
+
+        self.parts.extend((separator, indent, html.escape(prefix, quote=False), wrap[0], body, wrap[1]))
+        self.length += len(separator) + len(indent) + len(prefix) + visible
+        self.previous_type = block['type']
+        if cut:
+            self.parts.append('…')
+            self.truncated = True
+            self.length = self.budget
+
+    def html(self):
+        return ''.join(self.parts)
+
+
+def render_blocks(blocks, budget=None):
+    renderer = BlockRenderer(budget)
+    for block in blocks:
+        renderer.feed(block)
+        if renderer.exhausted:
+            break
+    return renderer.html()
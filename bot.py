@@ -24,9 +24,10 @@ TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 300))  # Default to 300 seconds if not set
 NOTION_TOKEN = os.getenv('NOTION_TOKEN')
 NOTION_DATABASE_ID = os.getenv('NOTION_DATABASE_ID')
+MAX_ITEMS_PER_CHECK = int(os.getenv('MAX_ITEMS_PER_CHECK', '5'))
 
 # Initialize NotionHandler
-notion_handler = NotionHandler(NOTION_TOKEN, NOTION_DATABASE_ID)
+notion_handler = NotionHandler(NOTION_TOKEN, NOTION_DATABASE_ID, MAX_ITEMS_PER_CHECK)
 
 def escape_markdown(text):
     escape_chars = r'_*[]()~`>#+-=|{}.!'
@@ -48,15 +49,15 @@ async def check_recent_items(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await send_item_preview(update, context, item)
 
 async def send_item_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, item):
-    title = item['properties']['Creation Title']['title'][0]['plain_text']
-    url = item['url']
-    content = item.get('content', 'No content available')
+    title = item.title
+    url = item.url
+    content = item.content or 'No content available'
 
     message = f"{title}\n\n{content[:200]}...\n\nView in Notion: {url}"
 
     keyboard = [
         [InlineKeyboardButton("View in Notion", url=url)],
-        [InlineKeyboardButton("Send to channel", callback_data=f"send_to_channel:{item['id']}")]
+        [InlineKeyboardButton("Send to channel", callback_data=f"send_to_channel:{item.id}")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -83,7 +84,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def schema(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Schema command received")
-    notion_handler.print_database_schema()
+    await notion_handler.print_database_schema()
     await update.message.reply_text('Database schema printed to console. Check your server logs.')
 
 async def get_quote(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_size(content):
+    return len(content.encode('utf-8'))
+
+
+class ContentCache:
+    # Entries are stored per page and only served while last_edited_time matches,
+    # so a newer edit of a page replaces the stale version instead of sitting beside it
+    def __init__(self, max_entries=1000, max_bytes=5 * 1024 * 1024, disk_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.disk = None
+        self.lock = threading.Lock()
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self.disk.execute("PRAGMA journal_mode=WAL")
+            self.disk.execute("""
+                CREATE TABLE IF NOT EXISTS page_content (
+                    page_id TEXT PRIMARY KEY,
+                    last_edited_time TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    stored_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            columns = [row[1] for row in self.disk.execute("PRAGMA table_info(page_content)")]
+            if 'stored_at' not in columns:
+                # Rows from before pruning count as old and go at the next prune
+                self.disk.execute("ALTER TABLE page_content ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+
+    def get(self, page_id, last_edited_time):
+        entry = self.entries.get(page_id)
+        if entry and entry[0] == last_edited_time:
+            self.entries.move_to_end(page_id)
+            self.hits += 1
+            return entry[1]
+        if self.disk:
+            with self.lock:
+                row = self.disk.execute(
+                    "SELECT content FROM page_content WHERE page_id = ? AND last_edited_time = ?",
+                    (page_id, last_edited_time)
+                ).fetchone()
+            if row:
+                with self.lock:
+                    self.disk.execute("UPDATE page_content SET stored_at = ? WHERE page_id = ?", (time.time(), page_id))
+                content = json.loads(row[0])
+                self.disk_hits += 1
+                self._store(page_id, last_edited_time, content)
+                return content
+        self.misses += 1
+        return None
+
+    def put(self, page_id, last_edited_time, content):
+        self._store(page_id, last_edited_time, content)
+        if self.disk:
+            with self.lock:
+                self.disk.execute(
+                    "INSERT INTO page_content (page_id, last_edited_time, content, stored_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(page_id) DO UPDATE SET last_edited_time = excluded.last_edited_time, "
+                    "content = excluded.content, stored_at = excluded.stored_at",
+                    (page_id, last_edited_time, json.dumps(content), time.time())
+                )
+
+    def prune_disk(self, max_age_days):
+        # The disk tier has no size bound of its own; pages neither written nor read
+        # for max_age_days are dropped (a later miss just fetches them again)
+        if not self.disk or not max_age_days:
+            return 0
+        with self.lock:
+            cursor = self.disk.execute(
+                "DELETE FROM page_content WHERE stored_at < ?", (time.time() - max_age_days * 86400,)
+            )
+        self.disk_evictions += cursor.rowcount
+        return cursor.rowcount
+
+    def _store(self, page_id, last_edited_time, content):
+        size = content_size(content)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(page_id, None)
+        if old:
+            self.total_bytes -= old[2]
+        self.entries[page_id] = (last_edited_time, content, size)
+        self.total_bytes += size
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def close(self):
+        if self.disk:
+            with self.lock:
+                self.disk.close()
@@ -0,0 +1,114 @@
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def default_instance_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    # Only the holder polls the database. It renews well before the ttl runs out;
+    # if it dies, another instance takes over once the ttl has passed
+    def __init__(self, store, name, holder, ttl=30.0, group=None):
+        self.store = store
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.group = group
+        self.expires_at = 0.0
+
+    @property
+    def held(self):
+        # Stop acting as leader a little early so clock skew cannot give two leaders
+        return time.time() < self.expires_at - self.ttl * 0.1
+
+    def renew(self):
+        was_held = self.held
+        try:
+            acquired = self.store.acquire_lease(self.name, self.holder, self.ttl)
+        except Exception as e:
+            logger.error(f"Error renewing lease {self.name}: {str(e)}")
+            acquired = False
+        self.expires_at = time.time() + self.ttl if acquired else 0.0
+        if acquired and not was_held:
+            logger.info(f"Acquired lease {self.name} as {self.holder}")
+        elif was_held and not acquired:
+            logger.warning(f"Lost lease {self.name}")
+        return acquired
+
+    def try_take(self):
+        # A lease in a group is only taken while this instance is below its share
+        if self.group and not self.group.below_share():
+            return False
+        return self.renew()
+
+    def release(self):
+        if self.expires_at:
+            self.store.release_lease(self.name, self.holder)
+            self.expires_at = 0.0
+
+
+class LeaseGroup:
+    # Spreads one lease per database over the live instances. Each instance keeps an
+    # instance:<id> heartbeat lease; it takes free leases only while it holds fewer than
+    # its share (databases / live instances, rounded up) and hands back any beyond it,
+    # so a newly started instance picks up databases within one rebalance.
+    def __init__(self, store, holder, ttl=30.0):
+        self.store = store
+        self.holder = holder
+        self.ttl = ttl
+        self.leases = []
+        self.heartbeat = Lease(store, f"instance:{holder}", holder, ttl)
+
+    def lease(self, name):
+        lease = Lease(self.store, name, self.holder, self.ttl, group=self)
+        self.leases.append(lease)
+        return lease
+
+    def share(self):
+        try:
+            instances = self.store.count_leases('instance:')
+        except Exception as e:
+            logger.error(f"Error counting instances: {str(e)}")
+            instances = 1
+        return -(-len(self.leases) // max(1, instances))
+
+    def below_share(self):
+        return sum(lease.held for lease in self.leases) < self.share()
+
+    def rebalance(self):
+        self.heartbeat.renew()
+        share = self.share()
+        held = [lease for lease in self.leases if lease.held]
+        for lease in held[share:]:
+            logger.info(f"Handing over lease {lease.name}; {share} per instance")
+            lease.release()
+        for lease in self.leases:
+            # Held leases are renewed; free ones are taken up to the share
+            if lease.held or sum(other.held for other in self.leases) < share:
+                lease.renew()
+
+    def release(self):
+        for lease in self.leases:
+            lease.release()
+        self.heartbeat.release()
+
+
+class DeliveryClaims:
+    # A page is claimed per delivery target before sending, so instances that
+    # overlap (e.g. during a failover) never post the same item twice
+    def __init__(self, store, holder, ttl=300.0):
+        self.store = store
+        self.holder = holder
+        self.ttl = ttl
+
+    def claim(self, item, scope):
+        return self.store.claim_delivery(item.id, item.last_edited_time, scope, self.holder, self.ttl)
+
+    def release(self, item, scope):
+        self.store.release_claim(item.id, scope, self.holder)
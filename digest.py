@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from telegram import InlineKeyboardMarkup
+from message_chunker import MESSAGE_LIMIT, telegram_length
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows 100 buttons per keyboard; each entry takes a row of two
+MAX_DIGEST_ENTRIES = 50
+
+
+class PendingDigest:
+    def __init__(self):
+        self.texts = []
+        self.rows = []
+        self.receipts = []
+        self.length = 0
+        self.timer = None
+
+
+class DigestBuffer:
+    # Collects items per chat for up to `window` seconds and sends them as one
+    # message with a keyboard row per entry. A digest goes out early once the next
+    # entry would push it past the message limit.
+    def __init__(self, render, send, window=30.0, limit=MESSAGE_LIMIT, max_entries=MAX_DIGEST_ENTRIES):
+        self.render = render
+        self.send = send
+        self.window = window
+        self.limit = limit
+        self.max_entries = max_entries
+        self.pending = {}
+        self.flushing = set()
+        self.digests = 0
+        self.entries = 0
+
+    def add(self, chat_id, item):
+        # Returns a future that resolves to True once the digest holding the item is sent
+        receipt = asyncio.get_running_loop().create_future()
+        digest = self.pending.get(chat_id)
+        number = len(digest.texts) + 1 if digest else 1
+        text, row = self.render(item, number)
+        if text is None:
+            receipt.set_result(False)
+            return receipt
+        length = telegram_length(text) + 2
+        if digest and (digest.length + length > self.limit or len(digest.texts) >= self.max_entries):
+            self._flush_later(chat_id)
+            digest = None
+            text, row = self.render(item, 1)
+            length = telegram_length(text) + 2
+        if digest is None:
+            digest = self.pending[chat_id] = PendingDigest()
+            digest.timer = asyncio.get_running_loop().call_later(self.window, self._flush_later, chat_id)
+        digest.texts.append(text)
+        digest.rows.append(row)
+        digest.receipts.append(receipt)
+        digest.length += length
+        self.entries += 1
+        return receipt
+
+    def _flush_later(self, chat_id):
+        digest = self.pending.pop(chat_id, None)
+        if digest is None:
+            return
+        digest.timer.cancel()
+        task = asyncio.create_task(self._send(chat_id, digest))
+        self.flushing.add(task)
+        task.add_done_callback(self.flushing.discard)
+
+    async def _send(self, chat_id, digest):
+        # An entry too long for any digest still goes out; the sender splits it
+        try:
+            await self.send(chat_id, "\n\n".join(digest.texts), InlineKeyboardMarkup(digest.rows))
+            self.digests += 1
+            sent = True
+        except Exception as e:
+            logger.error(f"Error sending digest of {len(digest.texts)} items to chat {chat_id}: {str(e)}")
+            sent = False
+        for receipt in digest.receipts:
+            if not receipt.done():
+                receipt.set_result(sent)
+
+    def stats(self):
+        return {
+            "pending": sum(len(digest.texts) for digest in self.pending.values()),
+            "digests": self.digests,
+            "entries": self.entries,
+        }
+
+    async def flush(self):
+        for chat_id in list(self.pending):
+            self._flush_later(chat_id)
+        if self.flushing:
+            await asyncio.gather(*list(self.flushing))
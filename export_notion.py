@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from contextlib import aclosing
+from dotenv import load_dotenv
+from notion_handler import NotionHandler, PREVIEW_LIMIT
+from page_record import SchemaExtractor, SchemaChanged
+from block_renderer import render_blocks
+
+# Snapshot a database to gzipped JSONL: a header line with the database (and so
+# its schema), then one line per page with its full block tree. Each batch of
+# up to 100 pages is written as its own gzip member and followed by a cursor
+# checkpoint, so an interrupted export resumes from the last completed batch.
+
+
+def checkpoint_path(output):
+    return f"{output}.cursor"
+
+
+def read_checkpoint(output):
+    try:
+        with open(checkpoint_path(output)) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(output, checkpoint):
+    # Written to the side and renamed so a crash never leaves a half-written checkpoint
+    temporary = f"{checkpoint_path(output)}.tmp"
+    with open(temporary, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary, checkpoint_path(output))
+
+
+def write_lines(output, lines):
+    with gzip.open(output, 'at', encoding='utf-8') as export_file:
+        for line in lines:
+            export_file.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')))
+            export_file.write('\n')
+    return os.path.getsize(output)
+
+
+async def fetch_page(handler, page, semaphore):
+    async with semaphore:
+        blocks = []
+        async with aclosing(handler.iter_blocks(page['id'])) as tree:
+            async for block in tree:
+                blocks.append(block)
+        return {"type": "page", "page": page, "blocks": blocks}
+
+
+async def export_database(handler, output, resume=False, concurrency=5, query=None):
+    checkpoint = read_checkpoint(output) if resume else None
+    if checkpoint and checkpoint.get('database_id') != handler.database_id:
+        raise SystemExit(f"{checkpoint_path(output)} belongs to database {checkpoint.get('database_id')}")
+    if checkpoint:
+        # Drop anything written after the last checkpoint; it is fetched again below
+        with open(output, 'r+b') as export_file:
+            export_file.truncate(checkpoint['bytes'])
+        if checkpoint.get('done'):
+            print(f"{output} is already complete ({checkpoint['pages']} pages)")
+            return checkpoint
+        print(f"Resuming {handler.database_id} after {checkpoint['pages']} pages")
+    else:
+        if os.path.exists(output):
+            os.remove(output)
+        database = await handler.client.databases.retrieve(database_id=handler.database_id)
+        checkpoint = {
+            "database_id": handler.database_id,
+            "next_cursor": None,
+            "pages": 0,
+            "bytes": write_lines(output, [{"type": "database", "database": database}]),
+            "done": False,
+        }
+        write_checkpoint(output, checkpoint)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aclosing(handler.iter_query_responses(start_cursor=checkpoint['next_cursor'], **(query or {}))) as responses:
+        async for response in responses:
+            # Pages of one batch are fetched concurrently but written in query order;
+            # only this batch is ever held in memory
+            lines = await asyncio.gather(*(fetch_page(handler, page, semaphore) for page in response['results']))
+            checkpoint['bytes'] = write_lines(output, lines)
+            checkpoint['pages'] += len(lines)
+            checkpoint['next_cursor'] = response.get('next_cursor')
+            checkpoint['done'] = not response.get('has_more')
+            write_checkpoint(output, checkpoint)
+            print(f"Exported {checkpoint['pages']} pages")
+    return checkpoint
+
+
+def read_export(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as export_file:
+        for line in export_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def warm_caches(path, content_cache=None, search_index=None):
+    # Feeds an export into the content cache and search index without calling Notion.
+    # Previews are rendered exactly as the bot renders them, so cache entries match.
+    extractor = None
+    warmed = 0
+    for entry in read_export(path):
+        if entry['type'] == 'database':
+            extractor = SchemaExtractor(entry['database']['properties'])
+            continue
+        page = entry['page']
+        content = render_blocks(entry['blocks'], PREVIEW_LIMIT)
+        if content_cache is not None:
+            content_cache.put(page['id'], page['last_edited_time'], content)
+        if search_index is not None and extractor is not None:
+            try:
+                search_index.put(extractor.project(page, content))
+            except SchemaChanged as e:
+                print(f"Skipping page {page['id']} from {path}: {str(e)}")
+        warmed += 1
+    return warmed
+
+
+async def run_export(args):
+    handler = NotionHandler(
+        os.getenv('NOTION_TOKEN'),
+        args.database or os.getenv('NOTION_DATABASE_ID'),
+        None,
+        base_url=os.getenv('NOTION_API_BASE_URL'),
+        max_concurrent_fetches=args.concurrency
+    )
+    try:
+        checkpoint = await export_database(handler, args.output, args.resume, args.concurrency)
+        print(f"Done: {checkpoint['pages']} pages in {args.output}; Notion client stats: {handler.client.stats()}")
+    finally:
+        await handler.close()
+
+
+def run_import(args):
+    from content_cache import ContentCache
+    from search_index import SearchIndex
+
+    # Same settings as main.py; only the persisted stores outlive this process
+    content_cache = None
+    if os.getenv('CONTENT_CACHE_PATH'):
+        content_cache = ContentCache(
+            int(os.getenv('CONTENT_CACHE_ENTRIES', '1000')),
+            int(os.getenv('CONTENT_CACHE_BYTES', str(5 * 1024 * 1024))),
+            os.getenv('CONTENT_CACHE_PATH')
+        )
+    search_index = SearchIndex(os.getenv('SEARCH_INDEX_PATH') or os.getenv('STATE_DB_PATH', 'bot_state.db'))
+    try:
+        for path in args.files:
+            print(f"Imported {warm_caches(path, content_cache, search_index)} pages from {path}")
+    finally:
+        if content_cache:
+            content_cache.close()
+        search_index.close()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export a Notion database to gzipped JSONL, or import an export")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help="stream every page and its blocks to a .jsonl.gz file")
+    export_parser.add_argument('output')
+    export_parser.add_argument('--database', help="defaults to NOTION_DATABASE_ID")
+    export_parser.add_argument('--resume', action='store_true', help="continue from the output's cursor checkpoint")
+    export_parser.add_argument('--concurrency', type=int, default=int(os.getenv('NOTION_MAX_CONCURRENCY', '5')))
+
+    import_parser = commands.add_parser('import', help="load exports into the persisted content cache and search index")
+    import_parser.add_argument('files', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        asyncio.run(run_export(args))
+    else:
+        run_import(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import atexit
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+# Transport chatter (a line per getUpdates, per Notion request or retry, per page
+# fetched, per job run) is rate-limited per message template; warnings and errors
+# always pass
+SAMPLED_LOGGERS = (
+    'httpx', 'httpcore', 'telegram.ext', 'notion_client', 'apscheduler', 'notion_handler', 'notion_transport'
+)
+
+TOKEN_PATTERNS = [
+    re.compile(r'\d{6,}:[A-Za-z0-9_-]{30,}'),
+    re.compile(r'\b(?:secret_|ntn_)[A-Za-z0-9]{20,}'),
+]
+
+
+class Redactor:
+    def __init__(self, secrets=()):
+        self.secrets = [secret for secret in secrets if secret and len(secret) >= 8]
+
+    def __call__(self, text):
+        for secret in self.secrets:
+            text = text.replace(secret, '<redacted>')
+        for pattern in TOKEN_PATTERNS:
+            text = pattern.sub('<redacted>', text)
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    # Lets `burst` records per template through each window and counts the rest;
+    # the count is logged as one summary line when the template next shows up
+    def __init__(self, burst=5, window=60.0, loggers=SAMPLED_LOGGERS):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.loggers = loggers
+        self.windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.loggers):
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.window:
+            if window and window[2]:
+                record.suppressed = window[2]
+            self.windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    # Only merges the arguments on the caller's thread; formatting, redaction
+    # and disk writes all happen on the writer thread
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a line beats blocking the event loop
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f" (+{record.suppressed} similar suppressed)"
+        return text
+
+
+class LogWriter(threading.Thread):
+    # Drains the queue on its own thread and flushes in batches: after
+    # flush_every records, on any warning, or after flush_interval seconds
+    def __init__(self, log_queue, handlers, redact, flush_every=100, flush_interval=1.0):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.handlers = handlers
+        self.redact = redact
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.stopping = object()
+
+    def run(self):
+        unflushed = 0
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if unflushed:
+                    self.flush()
+                    unflushed = 0
+                continue
+            if record is self.stopping:
+                self.flush()
+                return
+            record.msg = self.redact(record.msg)
+            if record.exc_text:
+                record.exc_text = self.redact(record.exc_text)
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.emit(record)
+                    except Exception:
+                        handler.handleError(record)
+            unflushed += 1
+            if unflushed >= self.flush_every or record.levelno >= logging.WARNING:
+                self.flush()
+                unflushed = 0
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self, timeout=5.0):
+        self.queue.put(self.stopping)
+        self.join(timeout)
+        for handler in self.handlers:
+            handler.close()
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    # The stock handler flushes after every record and formats each one twice to
+    # decide on rollover; the writer thread flushes in batches instead
+    def emit(self, record):
+        try:
+            message = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() + len(message.encode(self.encoding or 'utf-8')) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(message)
+        except Exception:
+            self.handleError(record)
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(level='INFO', log_file='bot.log', max_bytes=10 * 1024 * 1024, backup_count=5, log_format='json',
+                  secrets=(), sample_burst=5, sample_window=60.0, queue_size=10000):
+    file_handler = BufferedRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(
+        JsonFormatter() if log_format == 'json' else TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+    console_handler = BufferedStreamHandler()
+    console_handler.setFormatter(TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_burst, sample_window))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level))
+
+    writer = LogWriter(log_queue, [file_handler, console_handler], Redactor(secrets))
+    writer.start()
+    # Whatever is still queued is written out when the process exits
+    atexit.register(writer.stop)
+    return writer
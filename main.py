@@ -1,12 +1,27 @@
 import os
+import html
 import logging
-from logging.handlers import RotatingFileHandler
 import asyncio
+import secrets
+import signal
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from notion_handler import NotionHandler
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from state_store import StateStore
+from content_cache import ContentCache
+from telegram_sender import SendScheduler, INTERACTIVE, PERIODIC
+from message_chunker import split_html_message
+from router import Route, DatabaseRoutes, RouteScheduler, load_routes
+from poll_scheduler import AdaptiveInterval, DatabasePoller
+from approval_queue import ApprovalQueue
+from metrics import registry
+from log_pipeline import setup_logging
+from coordination import LeaseGroup, DeliveryClaims, default_instance_id
+from digest import DigestBuffer
+from search_index import SearchIndex
+from export_notion import warm_caches
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, ContextTypes
 import telegram
 
 # Load environment variables
@@ -16,124 +31,328 @@ NOTION_DATABASE_ID = os.getenv('NOTION_DATABASE_ID')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '300'))
+# Polling adapts between these bounds: back to the floor when items turn up, backing off while idle
+POLL_INTERVAL_MIN = int(os.getenv('POLL_INTERVAL_MIN', '30'))
+POLL_INTERVAL_MAX = int(os.getenv('POLL_INTERVAL_MAX', '1800'))
+POLL_BACKOFF = float(os.getenv('POLL_BACKOFF', '2'))
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+# 'json' writes one structured record per line to LOG_FILE; 'text' keeps the old layout
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+# Repetitive transport lines (httpx, job runs) are capped at this many per template per window
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '5'))
+LOG_SAMPLE_WINDOW = float(os.getenv('LOG_SAMPLE_WINDOW', '300'))
 MAX_ITEMS_PER_CHECK = int(os.getenv('MAX_ITEMS_PER_CHECK', '5'))
+NOTION_MAX_CONCURRENCY = int(os.getenv('NOTION_MAX_CONCURRENCY', '5'))
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'bot_state.db')
+STATE_RETENTION_DAYS = int(os.getenv('STATE_RETENTION_DAYS', '30'))
+# Fingerprints of sent items (about 50 bytes each) outlive the ledger; 0 keeps them forever
+FINGERPRINT_RETENTION_DAYS = int(os.getenv('FINGERPRINT_RETENTION_DAYS', '365'))
+CONTENT_CACHE_ENTRIES = int(os.getenv('CONTENT_CACHE_ENTRIES', '1000'))
+CONTENT_CACHE_BYTES = int(os.getenv('CONTENT_CACHE_BYTES', str(5 * 1024 * 1024)))
+CONTENT_CACHE_PATH = os.getenv('CONTENT_CACHE_PATH')
+CONTENT_CACHE_DISK_DAYS = int(os.getenv('CONTENT_CACHE_DISK_DAYS', '30'))
+# Re-edited items are posted again only if their title, link, routed fields or rendered preview
+# changed; set to false to skip comparing the preview (and downloading blocks), which also means
+# body-only edits are never posted again
+FINGERPRINT_CONTENT = os.getenv('FINGERPRINT_CONTENT', 'true').lower() in ('1', 'true', 'yes')
+# Item search index lives in the state database unless pointed elsewhere
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH') or STATE_DB_PATH
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', '10'))
+# Comma-separated export_notion.py exports loaded into the content cache and search index on start
+WARM_EXPORT_FILES = [path.strip() for path in os.getenv('WARM_EXPORT_FILES', '').split(',') if path.strip()]
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE_PER_MINUTE = float(os.getenv('TELEGRAM_GROUP_RATE_PER_MINUTE', '20'))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '30'))
+# Seconds to collect periodic items into one digest message per chat; 0 sends each item on its own
+DIGEST_WINDOW = float(os.getenv('DIGEST_WINDOW', '0'))
+# Approve taps landing within this window are written to Notion together
+APPROVAL_BATCH_WINDOW = float(os.getenv('APPROVAL_BATCH_WINDOW', '0.25'))
+# Instances sharing STATE_DB_PATH split the databases between them through one lease each
+INSTANCE_ID = os.getenv('INSTANCE_ID') or default_instance_id()
+LEASE_TTL = float(os.getenv('LEASE_TTL', '30'))
+CLAIM_TTL = float(os.getenv('CLAIM_TTL', '300'))
+# JSON file mapping databases and filters to chats; without it NOTION_DATABASE_ID goes to TELEGRAM_CHAT_ID
+ROUTES_FILE = os.getenv('ROUTES_FILE')
+# Prometheus scrape endpoint; disabled unless a port is set
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+# Point at a local Bot API server (or a fake one) instead of api.telegram.org
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+# Likewise for Notion, e.g. the fake server in benchmarks/
+NOTION_API_BASE_URL = os.getenv('NOTION_API_BASE_URL')
+# Webhook mode is used when a public URL is configured, otherwise the bot long-polls
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
 
-# Configure logging
-log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-log_file = 'bot.log'
-log_handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=5)
-log_handler.setFormatter(log_formatter)
-
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[log_handler, logging.StreamHandler()]
+# Configure logging: records are queued and written by a background thread
+log_writer = setup_logging(
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_FORMAT,
+    secrets=(TELEGRAM_TOKEN, NOTION_TOKEN, WEBHOOK_SECRET),
+    sample_burst=LOG_SAMPLE_BURST,
+    sample_window=LOG_SAMPLE_WINDOW
 )
 logger = logging.getLogger(__name__)
 
-# Initialize NotionHandler
-notion_handler = NotionHandler(NOTION_TOKEN, NOTION_DATABASE_ID, MAX_ITEMS_PER_CHECK)
+# Initialize the persistent checkpoint store, page content cache and NotionHandler
+state_store = StateStore(STATE_DB_PATH)
+content_cache = ContentCache(CONTENT_CACHE_ENTRIES, CONTENT_CACHE_BYTES, CONTENT_CACHE_PATH)
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+notion_handler = NotionHandler(
+    NOTION_TOKEN,
+    NOTION_DATABASE_ID,
+    MAX_ITEMS_PER_CHECK,
+    base_url=NOTION_API_BASE_URL,
+    max_concurrent_fetches=NOTION_MAX_CONCURRENCY,
+    state_store=state_store,
+    content_cache=content_cache,
+    search_index=search_index,
+    fingerprint_content=FINGERPRINT_CONTENT
+)
+
+# All outbound messages go through one rate-limited queue
+send_scheduler = SendScheduler(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE_PER_MINUTE / 60)
+
+# Approvals are applied to Notion in the background, off the callback path
+approval_queue = ApprovalQueue(notion_handler, APPROVAL_BATCH_WINDOW, NOTION_MAX_CONCURRENCY)
+
+# Per message: the keyboard as first seen and the buttons still showing, so a failed
+# approval puts back only its own button. Bounded to the most recent messages
+keyboards = {}
+KEYBOARD_MEMORY = 1000
+
+# Components that already count things are read at scrape time
+registry.add_stats('content_cache', content_cache.stats, "Page content cache state")
+registry.add_stats('search_index', search_index.stats, "Pages and terms in the search index")
+registry.add_stats('notion_client', notion_handler.client.stats, "Notion client request counts")
+registry.add_stats('approval_queue', approval_queue.stats, "Background approval writes")
+registry.add_stats('telegram_send_queue', lambda: {"pending": send_scheduler.pending()}, "Messages waiting to be sent")
+
+async def reply(update: Update, text, **kwargs):
+    return await send_scheduler.send_message(update.effective_chat.id, text, priority=INTERACTIVE, **kwargs)
+
+async def send_formatted(chat_id, formatted_content, reply_markup, priority):
+    # Split up front so every part is accepted first time; buttons go on the last part
+    parts = split_html_message(formatted_content)
+    for index, part in enumerate(parts):
+        await send_scheduler.send_message(
+            chat_id,
+            part,
+            priority=priority,
+            reply_markup=reply_markup if index == len(parts) - 1 else None,
+            parse_mode='HTML'
+        )
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text('Bot started. Use /check to manually check for new items.')
+    await reply(update, 'Bot started. Use /check to manually check for new items.')
 
 async def check_recent_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    items = await notion_handler.get_recently_done_content()
-    if items:
-        for item in items:
-            await send_item_preview(update, context, item)
-    else:
-        await update.message.reply_text("No new items found.")
+    found = 0
+    async for item in notion_handler.iter_recently_done_content():
+        found += 1
+        if await send_item_preview(update, context, item):
+            notion_handler.mark_delivered(item)
+        else:
+            notion_handler.mark_failed(item)
+    if not found:
+        await reply(update, "No new items found.")
 
 async def send_item_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, item):
     formatted_content, reply_markup = notion_handler.format_content_for_telegram(item)
     
     if not formatted_content:
-        await update.message.reply_text(f"Error displaying content for {item['properties']['Creation Title']['title'][0]['plain_text']}")
-        return
+        await reply(update, f"Error displaying content for {item.title}")
+        return False
 
     try:
-        sent_message = await update.message.reply_text(
-            formatted_content, 
-            reply_markup=reply_markup, 
-            parse_mode='HTML'
-        )
-    except telegram.error.BadRequest as e:
-        if "Message is too long" in str(e):
-            shortened_content = formatted_content[:3000] + "...\n\n(Content truncated due to length. Click 'View full content' to read more)"
-            await update.message.reply_text(
-                shortened_content,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            logger.error(f"Error sending message: {str(e)}")
+        await send_formatted(update.effective_chat.id, formatted_content, reply_markup, INTERACTIVE)
+        return True
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
+    return False
+
+def keyboard_state(key, markup):
+    if key not in keyboards:
+        showing = {button.callback_data for row in markup.inline_keyboard for button in row}
+        keyboards[key] = (markup, showing)
+        if len(keyboards) > KEYBOARD_MEMORY:
+            keyboards.pop(next(iter(keyboards)))
+    return keyboards[key]
+
+def build_keyboard(layout, showing):
+    # URL buttons have no callback data and always stay
+    rows = [[button for button in row if button.callback_data in showing] for row in layout.inline_keyboard]
+    rows = [row for row in rows if row]
+    return InlineKeyboardMarkup(rows) if rows else None
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
 
     if query.data.startswith('approve:'):
         item_id = query.data.split(':')[1]
-        success = await notion_handler.update_item_status(item_id, "Scheduled")
-        if success:
-            # Get the original message's inline keyboard
-            original_keyboard = query.message.reply_markup.inline_keyboard
-            # Find the "View Full Content" button
-            view_content_button = next((button for row in original_keyboard for button in row if button.text == "View full content"), None)
-            
-            if view_content_button:
-                # Create a new keyboard with only the "View Full Content" button
-                new_keyboard = InlineKeyboardMarkup([[view_content_button]])
-                await query.edit_message_reply_markup(reply_markup=new_keyboard)
-            else:
-                await query.edit_message_reply_markup(reply_markup=None)
-            
-            await query.message.reply_text("Item scheduled successfully!")
-        else:
-            await query.message.reply_text("Failed to schedule item. Please try again later.")
+        chat_id = query.message.chat_id
+        message_id = query.message.message_id
+        key = (chat_id, message_id)
+        layout, showing = keyboard_state(key, query.message.reply_markup)
 
-async def get_chat_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(f"Your chat ID is: {update.effective_chat.id}")
+        async def rollback():
+            # Put only this entry's Approve button back; other entries of a digest may
+            # have been approved since and must stay gone
+            layout, showing = keyboards.setdefault(key, (query.message.reply_markup, {None}))
+            showing.add(query.data)
+            await send_scheduler.submit(chat_id, 'edit_message_reply_markup', INTERACTIVE, message_id=message_id, reply_markup=build_keyboard(layout, showing))
+            await send_scheduler.send_message(chat_id, "Failed to schedule item. Please try again later.", priority=INTERACTIVE)
 
-async def check_and_send_updates(context: ContextTypes.DEFAULT_TYPE):
-    logger.info("Checking for updates...")
-    items = await notion_handler.get_recently_done_content()
-    if items:
-        for item in items:
-            formatted_content, reply_markup = notion_handler.format_content_for_telegram(item)
-            if formatted_content:
-                try:
-                    await context.bot.send_message(
-                        chat_id=TELEGRAM_CHAT_ID,
-                        text=formatted_content,
-                        reply_markup=reply_markup,
-                        parse_mode='HTML'
-                    )
-                except telegram.error.BadRequest as e:
-                    if "Message is too long" in str(e):
-                        shortened_content = formatted_content[:3000] + "...\n\n(Content truncated due to length. Click 'View full content' to read more)"
-                        await context.bot.send_message(
-                            chat_id=TELEGRAM_CHAT_ID,
-                            text=shortened_content,
-                            reply_markup=reply_markup,
-                            parse_mode='HTML'
-                        )
-                    else:
-                        logger.error(f"Error sending message: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error sending message: {str(e)}")
-            else:
-                logger.error(f"Error formatting content for item: {item['id']}")
+        if not approval_queue.submit(item_id, "Scheduled", on_failure=rollback):
+            await query.answer("Already scheduled")
+            return
+        await query.answer("Item scheduled")
+
+        # Update the keyboard right away; the Notion write happens in the background.
+        # Only the tapped Approve button goes, so a digest keeps the other entries' buttons
+        showing.discard(query.data)
+        await query.edit_message_reply_markup(reply_markup=build_keyboard(layout, showing))
     else:
-        logger.info("No new items found.")
+        await query.answer()
+
+async def get_chat_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await reply(update, f"Your chat ID is: {update.effective_chat.id}")
+
+async def deliver_item(chat_id, item):
+    formatted_content, reply_markup = notion_handler.format_content_for_telegram(item)
+    if not formatted_content:
+        logger.error(f"Error formatting content for item: {item.id}")
+        return False
+    try:
+        await send_formatted(chat_id, formatted_content, reply_markup, PERIODIC)
+        return True
+    except Exception as e:
+        logger.error(f"Error sending message: {str(e)}")
+        return False
+
+def build_routes():
+    if not ROUTES_FILE:
+        return [DatabaseRoutes(notion_handler, [Route('default', [TELEGRAM_CHAT_ID])])]
+    databases = []
+    for database_id, (options, routes) in load_routes(ROUTES_FILE).items():
+        fields = set().union(*(route.fields for route in routes))
+        if database_id == NOTION_DATABASE_ID:
+            # The default handler is reused so /check and the routes share one watermark;
+            # the database's options apply to it just as to a handler built here
+            handler = notion_handler
+            handler.extra_fields = tuple(fields)
+            handler.max_items_per_check = options.get('max_items_per_check', MAX_ITEMS_PER_CHECK)
+            handler.max_concurrent_fetches = options.get('max_concurrency', NOTION_MAX_CONCURRENCY)
+            handler.block_semaphore = asyncio.Semaphore(handler.max_concurrent_fetches)
+        else:
+            handler = NotionHandler(
+                NOTION_TOKEN,
+                database_id,
+                options.get('max_items_per_check', MAX_ITEMS_PER_CHECK),
+                max_concurrent_fetches=options.get('max_concurrency', NOTION_MAX_CONCURRENCY),
+                state_store=state_store,
+                content_cache=content_cache,
+                search_index=search_index,
+                fingerprint_content=FINGERPRINT_CONTENT,
+                client=notion_handler.client,
+                extra_fields=fields
+            )
+        databases.append(DatabaseRoutes(handler, routes))
+    return databases
+
+async def send_digest(chat_id, formatted_content, reply_markup):
+    await send_formatted(chat_id, formatted_content, reply_markup, PERIODIC)
+
+digest_buffer = DigestBuffer(notion_handler.format_digest_entry, send_digest, DIGEST_WINDOW) if DIGEST_WINDOW > 0 else None
+route_scheduler = RouteScheduler(
+    build_routes(),
+    deliver_item,
+    DeliveryClaims(state_store, INSTANCE_ID, CLAIM_TTL),
+    digest_buffer
+)
+if digest_buffer:
+    registry.add_stats('digest', digest_buffer.stats, "Digest messages and buffered entries")
+leases = LeaseGroup(state_store, INSTANCE_ID, LEASE_TTL)
+pollers = [
+    DatabasePoller(
+        route_scheduler,
+        database,
+        AdaptiveInterval(POLL_INTERVAL_MIN, POLL_INTERVAL_MAX, POLL_BACKOFF, initial=CHECK_INTERVAL),
+        leases.lease(f"poll:{database.handler.database_id}")
+    )
+    for database in route_scheduler.databases
+]
+
+async def renew_leases(context: ContextTypes.DEFAULT_TYPE):
+    # Renews held leases, hands back any beyond this instance's share and takes free ones up to
+    # it, which is also how a database moves over when its holder stops renewing
+    leases.rebalance()
+
+async def poll_database(context: ContextTypes.DEFAULT_TYPE):
+    poller = context.job.data
+    database_id = poller.database.handler.database_id
+    logger.info(f"Checking database {database_id} for updates...")
+    try:
+        await poller.poll()
+    finally:
+        # The next run is only queued once this one is done, so polls never overlap
+        context.job_queue.run_once(poll_database, poller.interval.current, data=poller, name=poller.name)
+        logger.info(f"Next check of database {database_id} in {poller.interval.current:.0f}s")
+
+async def housekeeping(context: ContextTypes.DEFAULT_TYPE):
+    state_store.prune_delivered(STATE_RETENTION_DAYS, FINGERPRINT_RETENTION_DAYS)
+    content_cache.prune_disk(CONTENT_CACHE_DISK_DAYS)
+    logger.info(f"Content cache stats: {content_cache.stats()}")
+    logger.info(f"Notion client stats: {notion_handler.client.stats()}")
+    logger.info(f"Approval queue stats: {approval_queue.stats()}")
+
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = " ".join(context.args)
+    if not query:
+        await reply(update, "Usage: /search <words>")
+        return
+    # Served from the local index; Notion is not queried
+    results = search_index.search(query, SEARCH_RESULTS)
+    if not results:
+        await reply(update, "No matching items found.")
+        return
+    lines = [f"🔎 <b>{html.escape(query)}</b>"]
+    for number, page in enumerate(results, 1):
+        lines.append(f"{number}. <a href=\"{html.escape(page.url)}\">{html.escape(page.title)}</a>\n<i>{html.escape(page.snippet)}</i>")
+    await reply(update, "\n\n".join(lines), parse_mode='HTML', disable_web_page_preview=True)
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query.query
+    results = [
+        InlineQueryResultArticle(
+            id=page.page_id,
+            title=page.title,
+            description=page.snippet,
+            url=page.url,
+            input_message_content=InputTextMessageContent(
+                f"📝 <b>{html.escape(page.title)}</b>\n{html.escape(page.url)}", parse_mode='HTML'
+            )
+        )
+        for page in (search_index.search(query, SEARCH_RESULTS) if query.strip() else [])
+    ]
+    await update.inline_query.answer(results, cache_time=10)
 
 async def schema(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    notion_handler.print_database_schema()
-    await update.message.reply_text("Database schema printed to console.")
+    await notion_handler.print_database_schema()
+    await reply(update, "Database schema printed to console.")
+
+async def get_quote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await reply(update, await notion_handler.get_random_quote())
 
 async def view_scheduled_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
     items = await notion_handler.get_scheduled_items()
@@ -141,48 +360,108 @@ async def view_scheduled_items(update: Update, context: ContextTypes.DEFAULT_TYP
         for item in items:
             await send_item_preview(update, context, item)
     else:
-        await update.message.reply_text("No scheduled items found.")
+        await reply(update, "No scheduled items found.")
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
 async def main():
+    # SIGINT/SIGTERM trigger a graceful shutdown instead of killing in-flight work
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    application = None
+    metrics_server = None
     try:
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
+        if METRICS_PORT:
+            metrics_server = await registry.serve(METRICS_HOST, METRICS_PORT)
+            logger.info(f"Serving metrics on {METRICS_HOST}:{METRICS_PORT}/metrics")
+
+        for path in WARM_EXPORT_FILES:
+            try:
+                warmed = await asyncio.to_thread(warm_caches, path, content_cache, search_index)
+                logger.info(f"Warmed caches with {warmed} pages from {path}")
+            except Exception as e:
+                logger.error(f"Error warming caches from {path}: {str(e)}")
+
+        # Handle updates concurrently so callback answers are not queued behind a slow /check
+        builder = Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(True)
+        if TELEGRAM_API_BASE_URL:
+            builder = builder.base_url(TELEGRAM_API_BASE_URL)
+        application = builder.build()
 
         # Add handlers
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("get_chat_id", get_chat_id))
         application.add_handler(CommandHandler("check", check_recent_items))
         application.add_handler(CommandHandler("schema", schema))
+        application.add_handler(CommandHandler("quote", get_quote))
         application.add_handler(CommandHandler("view_scheduled", view_scheduled_items))
+        application.add_handler(CommandHandler("search", search))
+        application.add_handler(InlineQueryHandler(inline_search))
         application.add_handler(CallbackQueryHandler(button_click))
         application.add_error_handler(error_handler)
 
-        # Start periodic checking
-        application.job_queue.run_repeating(check_and_send_updates, interval=CHECK_INTERVAL, first=10)
+        # Start periodic checking; each database paces itself
+        for poller in pollers:
+            application.job_queue.run_once(poll_database, 10, data=poller, name=poller.name)
+        application.job_queue.run_repeating(housekeeping, interval=CHECK_INTERVAL, first=CHECK_INTERVAL)
+        leases.rebalance()
+        application.job_queue.run_repeating(renew_leases, interval=LEASE_TTL / 3, first=LEASE_TTL / 3)
 
         logger.info("Starting application")
         await application.initialize()
         await application.start()
-        
-        logger.info("Bot is now polling for updates")
-        await application.updater.start_polling()
-        
+        send_scheduler.start(application.bot)
+
+        if WEBHOOK_URL:
+            # Telegram pushes updates to the embedded server and signs them with the secret token
+            logger.info(f"Bot is now receiving webhook updates on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+            await application.updater.start_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET
+            )
+        else:
+            logger.info("Bot is now polling for updates")
+            await application.updater.start_polling()
+
         # Run the bot until you press Ctrl-C
         logger.info("Bot is running. Press Ctrl-C to stop.")
-        
-        # Keep the bot running
-        while True:
-            await asyncio.sleep(1)
-            
+        await stop_event.wait()
+        logger.info("Received stop signal, shutting down...")
+
     except KeyboardInterrupt:
         logger.info("Received Ctrl-C, shutting down...")
     except Exception as e:
         logger.error(f"Failed to start bot: {str(e)}", exc_info=True)
     finally:
         logger.info("Stopping application")
-        await application.stop()
+        if metrics_server:
+            metrics_server.close()
+        if application:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            if digest_buffer:
+                await digest_buffer.flush()
+            await approval_queue.stop(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+            await send_scheduler.stop(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+            await application.shutdown()
+        # Hand the databases over right away instead of making the others wait out the ttl
+        leases.release()
+        await notion_handler.close()
+        state_store.close()
+        content_cache.close()
+        search_index.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,70 @@
+import html
+import re
+
+# Telegram's limit applies to the text left after entity parsing, counted in UTF-16 code units
+MESSAGE_LIMIT = 4096
+
+TAG_RE = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9-]*)([^>]*)>')
+TOKEN_RE = re.compile(r'<[^>]*>|&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);|\n+|[ \t]+|[^<&\s]+|[<&]')
+
+
+def utf16_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def telegram_length(html_text):
+    return utf16_length(html.unescape(TAG_RE.sub('', html_text)))
+
+
+def split_html_message(html_text, limit=MESSAGE_LIMIT):
+    # Split into parts that each fit the limit, closing open tags at the end of a part
+    # and reopening them at the start of the next one. Entities are never cut.
+    if telegram_length(html_text) <= limit:
+        return [html_text]
+
+    parts = []
+    open_tags = []
+    current = []
+    length = 0
+
+    def flush():
+        closing = ''.join(f'</{name}>' for name, _ in reversed(open_tags))
+        parts.append(''.join(current) + closing)
+        current[:] = [tag for _, tag in open_tags]
+
+    for token in TOKEN_RE.findall(html_text):
+        tag = TAG_RE.fullmatch(token)
+        if tag:
+            closing, name = tag.group(1), tag.group(2).lower()
+            if closing:
+                for index in range(len(open_tags) - 1, -1, -1):
+                    if open_tags[index][0] == name:
+                        del open_tags[index]
+                        break
+            else:
+                open_tags.append((name, token))
+            current.append(token)
+            continue
+
+        size = telegram_length(token)
+        if length + size > limit and length > 0:
+            flush()
+            length = 0
+            if token.isspace():
+                continue
+        if size > limit:
+            # A single word longer than a whole message is cut by characters
+            for char in token:
+                char_size = utf16_length(char)
+                if length + char_size > limit:
+                    flush()
+                    length = 0
+                current.append(char)
+                length += char_size
+            continue
+        current.append(token)
+        length += size
+
+    if length > 0:
+        flush()
+    return parts
@@ -0,0 +1,187 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cached read up to a rate-limited retry chain
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+NOTION_ID = re.compile(r'^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$')
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = (f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def endpoint_label(path):
+    # Page and block IDs would make one series per page, so they collapse to :id
+    return "/".join(":id" if NOTION_ID.match(part) else part for part in path.split('/'))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # An unlabelled counter is exported as 0 from the start rather than appearing later
+        self.values = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Histogram:
+    # Only bucket counts, a sum and a count are kept, so observe() is a bisect and three adds
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        labelnames = self.labelnames + ('le',)
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{format_labels(labelnames, key + (format_value(bound),))} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(labelnames, key + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix, stats, documentation="", **labels):
+        # Components that already keep a stats() dict are read at scrape time instead of
+        # being instrumented twice; every key becomes a gauge named <prefix>_<key>
+        self.collectors.append((prefix, stats, documentation, labels))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        gauges = {}
+        for prefix, stats, documentation, labels in self.collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.error(f"Error collecting {prefix} metrics: {str(e)}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    gauges.setdefault(f"{prefix}_{key}", (documentation, []))[1].append((labels, value))
+        for name, (documentation, samples) in gauges.items():
+            lines.append(f"# HELP {name} {documentation or name}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(tuple(labels), tuple(labels.values()))} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port):
+        # A bare HTTP/1.0 responder is all a Prometheus scrape needs
+        async def handle(reader, writer):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), 5)
+                while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                    pass
+                parts = request_line.decode('latin-1').split()
+                if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                    status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.render().encode('utf-8')
+                else:
+                    status, content_type, body = "404 Not Found", "text/plain", b"Not found\n"
+                writer.write(
+                    f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+                )
+                await writer.drain()
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+registry = Registry()
+
+notion_request_seconds = registry.histogram(
+    'notion_request_seconds', 'Latency of Notion API calls, including retries', ('method', 'endpoint', 'outcome')
+)
+notion_attempts = registry.counter(
+    'notion_attempts_total', 'Individual Notion HTTP attempts by result', ('endpoint', 'result')
+)
+rate_limit_wait_seconds = registry.histogram(
+    'rate_limit_wait_seconds', 'Time spent waiting for a rate limiter token', ('limiter',)
+)
+telegram_request_seconds = registry.histogram(
+    'telegram_request_seconds', 'Latency of Telegram Bot API calls', ('method', 'outcome')
+)
+cycle_seconds = registry.histogram(
+    'check_cycle_seconds', 'Duration of a full check of one database', ('database',)
+)
+items_fetched = registry.counter('items_fetched_total', 'Items returned by database checks', ('database',))
+items_sent = registry.counter('items_sent_total', 'Items delivered to a chat', ('route',))
+items_failed = registry.counter('items_failed_total', 'Items that could not be delivered', ('route',))
+items_unchanged = registry.counter(
+    'items_unchanged_total', 'Re-edited items not sent again because their fingerprint matched', ('database', 'stage')
+)
+items_truncated = registry.counter('items_truncated_total', 'Page previews cut off at the preview limit')
@@ -1,5 +1,5 @@
-from notion_client import Client, APIResponseError
-from datetime import datetime, timedelta
+from notion_client import APIResponseError
+from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
 import re
@@ -7,28 +7,95 @@ import json
 import html
 import textwrap
 import asyncio
+from contextlib import aclosing
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-import aiohttp
-from aiohttp import ClientTimeout
+import httpx
 import random
+import logging
+from notion_transport import RateLimitedAsyncClient, is_transient_error
+from block_renderer import BlockRenderer
+from quote_pool import QuotePool
+from page_record import SchemaExtractor, SchemaChanged, fingerprint, fields_fingerprint, content_fingerprint
+from metrics import items_truncated, items_unchanged
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+NOTION_POOL_SIZE = int(os.getenv('NOTION_POOL_SIZE', '10'))
+NOTION_KEEPALIVE_EXPIRY = float(os.getenv('NOTION_KEEPALIVE_EXPIRY', '60'))
+NOTION_RATE_LIMIT = float(os.getenv('NOTION_RATE_LIMIT', '3'))
+NOTION_MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', '5'))
+# Cycles a page's content may fail transiently before it is delivered without a preview
+CONTENT_FAILURE_LIMIT = int(os.getenv('CONTENT_FAILURE_LIMIT', '3'))
+QUOTE_REFRESH_INTERVAL = int(os.getenv('QUOTE_REFRESH_INTERVAL', '300'))
+PREVIEW_LIMIT = 1000
+# Block types whose children belong to another page or database, not to this page's body
+SKIP_CHILDREN_TYPES = {'child_page', 'child_database'}
+
 class NotionHandler:
-    def __init__(self, token, database_id, max_items_per_check):
+    def __init__(self, token, database_id, max_items_per_check, base_url=None, max_concurrent_fetches=5, state_store=None, content_cache=None,
+                 client=None, extra_fields=(), delivery_scopes=('',), search_index=None, fingerprint_content=True):
         self.token = token
         self.database_id = database_id
-        self.client = Client(auth=token)
-        self.last_check_time = (datetime.now() - timedelta(days=7)).isoformat()
+        # Handlers for other databases can share this handler's client, pool and rate limit
+        self.owns_client = client is None
+        if client is None:
+            client = create_notion_client(token, base_url)
+        self.client = client
+        self.http = client.client
+        self.last_cycle_succeeded = True
+        self.cycle_handled = None
+        self.cycle_failed = []
+        # Failure counts when there is no state store to keep them
+        self.content_failures = {}
+        self.state_store = state_store
+        self.content_cache = content_cache
+        self.search_index = search_index
+        self.checkpoint_key = f"last_check_time:{database_id}"
+        self.last_check_time = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+        if state_store:
+            # Resume from the persisted high-water mark instead of re-scanning a week
+            self.last_check_time = state_store.get_checkpoint(self.checkpoint_key, self.last_check_time)
         self.max_items_per_check = max_items_per_check
-        self.headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Notion-Version": "2022-06-28",
-            "Content-Type": "application/json"
-        }
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.block_semaphore = asyncio.Semaphore(max_concurrent_fetches)
+        self.cycle_lock = asyncio.Lock()
+        self.quote_pool = QuotePool(self, QUOTE_REFRESH_INTERVAL)
+        self.extractor = None
+        self.extra_fields = tuple(extra_fields)
+        self.delivery_scopes = tuple(delivery_scopes)
+        # On: a re-edited page is fetched in full and only skipped when its title, link,
+        # routed fields and rendered preview all match what was sent. Off: the preview is
+        # not compared, so the block download is skipped too, but body edits are not posted.
+        self.fingerprint_content = fingerprint_content
+
+    async def close(self):
+        if self.owns_client:
+            await self.client.aclose()
 
     async def get_recently_done_content(self):
+        return [item async for item in self.iter_recently_done_content()]
+
+    async def iter_recently_done_content(self, settle=None):
+        # One cycle per database at a time: a manual /check waits for a scheduled poll to finish.
+        # The watermark is only written once the cycle's deliveries have settled (awaiting
+        # `settle`, if given), and never past an item reported through mark_failed.
+        async with self.cycle_lock:
+            self.cycle_handled = None
+            self.cycle_failed = []
+            try:
+                async with aclosing(self._iter_recently_done_content()) as items:
+                    async for item in items:
+                        yield item
+                if settle is not None:
+                    await settle()
+            finally:
+                self.commit_checkpoint()
+
+    async def _iter_recently_done_content(self):
         try:
+            self.refresh_checkpoint()
             filter_params = {
                 "filter": {
                     "and": [
@@ -41,132 +108,350 @@ class NotionHandler:
                         {
                             "timestamp": "last_edited_time",
                             "last_edited_time": {
-                                "after": self.last_check_time
+                                "on_or_after": self.last_check_time
                             }
                         }
                     ]
                 },
+                # Oldest first, so the watermark only ever moves past items already handed out
                 "sorts": [
                     {
                         "timestamp": "last_edited_time",
-                        "direction": "descending"
+                        "direction": "ascending"
                     }
                 ]
             }
 
-            response = self.client.databases.query(**filter_params, database_id=self.database_id, page_size=self.max_items_per_check)
-            
-            items = []
-            async with aiohttp.ClientSession() as session:
-                for page in response['results']:
-                    content = await self.extract_page_content(session, page['id'])
-                    page['content'] = content
-                    items.append(page)
-
-            self.last_check_time = datetime.now().isoformat()
-            return items
+            self.last_cycle_succeeded = False
+            # The cap counts undelivered pages only: a bulk edit can leave more pages than
+            # the cap on one timestamp, and the delivered ones must not hide the rest
+            remaining = self.max_items_per_check
+            async with aclosing(self.iter_database_query(**filter_params)) as batches:
+                async for results in batches:
+                    pages = await self.project_pages(results)
+                    # Notion timestamps are minute-granular, so the filter is inclusive and
+                    # pages already delivered at the same edit time are dropped here
+                    new_pages = [page for page in pages if not self.is_delivered(page)]
+                    if remaining is not None and len(new_pages) > remaining:
+                        # Stop in front of the first page over the cap; the watermark stays before it
+                        pages = pages[:pages.index(new_pages[remaining])]
+                        new_pages = new_pages[:remaining]
+                    unchanged = set()
+                    if not self.fingerprint_content:
+                        unchanged = {page.id for page in new_pages if self.is_unchanged(page)}
+                    fetch_pages = [page for page in new_pages if page.id not in unchanged]
+                    contents = dict(zip((page.id for page in fetch_pages), await self.fetch_pages_content(fetch_pages)))
+                    handled = []
+                    for page in pages:
+                        if page.id in unchanged:
+                            self.skip_unchanged(page)
+                        elif page.id in contents:
+                            content = contents[page.id]
+                            if isinstance(content, Exception):
+                                logger.error("Error extracting page content for %s: %s", page.id, content)
+                                if is_transient_error(content):
+                                    if self.count_content_failure(page) < CONTENT_FAILURE_LIMIT:
+                                        # Leave the watermark before this page so the next cycle retries it
+                                        self.note_handled(handled)
+                                        return
+                                    # One page Notion keeps failing on must not hold up the whole database
+                                    logger.warning(
+                                        "Delivering %s without a preview after %d failed cycles", page.id, CONTENT_FAILURE_LIMIT
+                                    )
+                                content = ""
+                            record = page.with_content(content)
+                            if self.fingerprint_content and self.is_unchanged(record):
+                                self.skip_unchanged(record)
+                            else:
+                                if self.search_index is not None:
+                                    self.search_index.put(record)
+                                yield record
+                        handled.append(page)
+                    self.note_handled(pages)
+                    if remaining is not None:
+                        remaining -= len(new_pages)
+                        if remaining <= 0:
+                            break
+            self.last_cycle_succeeded = True
         except Exception as e:
-            print(f"Error fetching Notion content: {str(e)}")
-            return []
+            logger.error("Error fetching Notion content: %s", e)
+
+    async def iter_database_query(self, max_items=None, **query):
+        # Yield each page of query results as it arrives, following next_cursor up to max_items
+        async with aclosing(self.iter_query_responses(max_items, **query)) as responses:
+            async for response in responses:
+                if response['results']:
+                    yield response['results']
+
+    async def iter_query_responses(self, max_items=None, start_cursor=None, **query):
+        # Raw query responses, so callers that checkpoint can keep each next_cursor
+        remaining = max_items
+        while remaining is None or remaining > 0:
+            params = dict(query, database_id=self.database_id, page_size=100 if remaining is None else min(100, remaining))
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            response = await self.client.databases.query(**params)
+            if remaining is not None:
+                response['results'] = response['results'][:remaining]
+                remaining -= len(response['results'])
+            yield response
+            if not response.get('has_more'):
+                break
+            start_cursor = response.get('next_cursor')
+
+    async def compile_schema(self, database=None):
+        if database is None:
+            database = await self.client.databases.retrieve(database_id=self.database_id)
+        extractor = SchemaExtractor(database['properties'], self.extra_fields)
+        if self.extractor and self.extractor.signature != extractor.signature:
+            logger.warning("Database schema changed, recompiled page extractor")
+        self.extractor = extractor
+        return extractor
+
+    async def project_pages(self, pages):
+        # Reduce raw Notion pages to compact records, recompiling once if the schema moved
+        extractor = self.extractor or await self.compile_schema()
+        try:
+            return [extractor.project(page) for page in pages]
+        except SchemaChanged:
+            extractor = await self.compile_schema()
+            return [extractor.project(page) for page in pages]
+
+    def is_delivered(self, page, scope=None):
+        # Without a scope, a page counts as delivered once every target has it
+        if not self.state_store:
+            return False
+        scopes = self.delivery_scopes if scope is None else (scope,)
+        return all(self.state_store.is_delivered(page.id, page.last_edited_time, scope) for scope in scopes)
+
+    def mark_delivered(self, page, scope=None):
+        if self.state_store:
+            fields, content = fingerprint(page)
+            for scope in (self.delivery_scopes if scope is None else (scope,)):
+                self.state_store.mark_delivered(page.id, page.last_edited_time, scope)
+                self.state_store.set_fingerprint(page.id, scope, fields, content)
+
+    def is_unchanged(self, page, scope=None):
+        # Without a scope, every target that was sent the page must have been sent this
+        # version, and none may be owed it after a failed send
+        if not self.state_store:
+            return False
+        stored = self.state_store.get_fingerprints(page.id)
+        sent = [stored[scope] for scope in (self.delivery_scopes if scope is None else (scope,)) if scope in stored]
+        if not sent:
+            return False
+        fields = fields_fingerprint(page)
+        content = content_fingerprint(page.content) if self.fingerprint_content else None
+        return all(fields == sent_fields and content in (None, sent_content) for sent_fields, sent_content in sent)
+
+    def skip_unchanged(self, page, scope=None):
+        # Recorded at the new edit time so the inclusive time filter does not bring it back;
+        # only targets that were sent the page before are recorded
+        stored = self.state_store.get_fingerprints(page.id)
+        for scope in (self.delivery_scopes if scope is None else (scope,)):
+            if scope in stored:
+                self.state_store.mark_delivered(page.id, page.last_edited_time, scope)
+        self.state_store.touch_fingerprints(page.id)
+        stage = 'content' if self.fingerprint_content else 'fields'
+        items_unchanged.inc(database=self.database_id, stage=stage)
+        logger.info("Not posting %s again: unchanged since it was sent (compared %s)", page.id, stage)
+
+    def refresh_checkpoint(self):
+        # Another instance sharing the store may have moved the watermark on since we last polled
+        if self.state_store:
+            stored = self.state_store.get_checkpoint(self.checkpoint_key)
+            if stored and parse_notion_time(stored) > parse_notion_time(self.last_check_time):
+                self.last_check_time = stored
+
+    def count_content_failure(self, page):
+        if self.state_store:
+            return self.state_store.record_content_failure(page.id, page.last_edited_time)
+        key = (page.id, page.last_edited_time)
+        self.content_failures[key] = self.content_failures.get(key, 0) + 1
+        return self.content_failures[key]
+
+    def note_handled(self, pages):
+        times = [page.last_edited_time for page in pages]
+        if self.cycle_handled:
+            times.append(self.cycle_handled)
+        self.cycle_handled = max(times, key=parse_notion_time, default=None)
 
-    async def extract_page_content(self, session, page_id):
+    def mark_failed(self, page, scope=None):
+        # The inclusive time filter brings a page at the watermark back, so holding
+        # the watermark at the oldest failed edit retries it on the next cycle
+        self.cycle_failed.append(page.last_edited_time)
+        if self.state_store:
+            # Empty digests match nothing, so a later touch cannot skip a target still owed the page
+            for scope in (self.delivery_scopes if scope is None else (scope,)):
+                self.state_store.set_fingerprint(page.id, scope, b'', b'')
+
+    def commit_checkpoint(self):
+        latest = self.cycle_handled
+        if latest and self.cycle_failed:
+            latest = min(self.cycle_failed + [latest], key=parse_notion_time)
+        self.advance_checkpoint(latest)
+
+    def advance_checkpoint(self, latest):
+        # Move the high-water mark to the given edit time, never backwards
+        if latest and parse_notion_time(latest) > parse_notion_time(self.last_check_time):
+            self.last_check_time = latest
+            if self.state_store:
+                self.state_store.set_checkpoint(self.checkpoint_key, latest)
+
+    async def extract_pages_content(self, pages):
+        results = await self.fetch_pages_content(pages)
+        items = []
+        for page, content in zip(pages, results):
+            if isinstance(content, Exception):
+                logger.error("Error extracting page content for %s: %s", page.id, content)
+                content = ""
+            items.append(page.with_content(content))
+        return items
+
+    async def fetch_pages_content(self, pages):
+        # Fetch block content for a batch of pages concurrently, keeping the original order.
+        # Failures are returned in place of the content instead of being raised.
+        semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+
+        async def fetch(page):
+            async with semaphore:
+                return await self.read_page_content(page.id, page.last_edited_time)
+
+        return await asyncio.gather(*(fetch(page) for page in pages), return_exceptions=True)
+
+    async def extract_page_content(self, page_id, last_edited_time=None, limit=PREVIEW_LIMIT):
         try:
-            print(f"Extracting content for page: {page_id}")
-            async with session.get(
-                f"https://api.notion.com/v1/blocks/{page_id}/children",
-                headers=self.headers,
-                timeout=ClientTimeout(total=10)
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    blocks = data.get('results', [])
-                    content = []
-                    for block in blocks:
-                        if block['type'] == 'paragraph':
-                            text = block['paragraph']['rich_text']
-                            if text:
-                                content.append(text[0]['plain_text'])
-                    return content
-                else:
-                    print(f"Error fetching page content: {response.status}")
-                    return []
+            return await self.read_page_content(page_id, last_edited_time, limit)
+        except APIResponseError as e:
+            logger.error("Error fetching page content: %s", e.status)
+            return ""
         except Exception as e:
-            print(f"Error extracting page content: {str(e)}")
-            return []
+            logger.error("Error extracting page content: %s", e)
+            return ""
+
+    async def read_page_content(self, page_id, last_edited_time=None, limit=PREVIEW_LIMIT):
+        # Unchanged pages are served from the cache without touching /blocks
+        use_cache = self.content_cache is not None and last_edited_time is not None and limit == PREVIEW_LIMIT
+        if use_cache:
+            cached = self.content_cache.get(page_id, last_edited_time)
+            if cached is not None:
+                return cached
+        logger.info("Extracting content for page: %s", page_id)
+        renderer = BlockRenderer(limit)
+        async with aclosing(self.iter_blocks(page_id)) as blocks:
+            async for block in blocks:
+                renderer.feed(block)
+                # Stop downloading once there is enough text for the preview
+                if renderer.exhausted:
+                    break
+        content = renderer.html()
+        if renderer.truncated:
+            items_truncated.inc()
+        if use_cache:
+            self.content_cache.put(page_id, last_edited_time, content)
+        return content
+
+    async def list_block_children(self, block_id, start_cursor=None):
+        params = {"block_id": block_id, "page_size": 100}
+        if start_cursor:
+            params["start_cursor"] = start_cursor
+        async with self.block_semaphore:
+            return await self.client.blocks.children.list(**params)
+
+    async def iter_blocks(self, block_id, depth=0, first_response=None):
+        # Walk the block tree in document order, following cursors. Children of each
+        # batch are prefetched in parallel while the parent blocks are being consumed.
+        response = first_response or await self.list_block_children(block_id)
+        while True:
+            results = response.get('results', [])
+            children = {
+                block['id']: asyncio.ensure_future(self.list_block_children(block['id']))
+                for block in results
+                if block.get('has_children') and block['type'] not in SKIP_CHILDREN_TYPES
+            }
+            try:
+                for block in results:
+                    block['depth'] = depth
+                    yield block
+                    if block['id'] in children:
+                        child_response = await children.pop(block['id'])
+                        async with aclosing(self.iter_blocks(block['id'], depth + 1, child_response)) as nested:
+                            async for child in nested:
+                                yield child
+            finally:
+                for task in children.values():
+                    task.cancel()
+            if not response.get('has_more'):
+                break
+            response = await self.list_block_children(block_id, response.get('next_cursor'))
 
     def format_content_for_telegram(self, page):
         try:
-            title = html.escape(page['properties']['Creation Title']['title'][0]['plain_text'])
-            content = page['content']
-            url = page['url']
+            title = html.escape(page.title)
+            content = page.content
+            url = page.url
 
             formatted_content = f"📝 <b>{title}</b>\n\n"
 
-            # Combine all paragraphs into a single string
-            full_content = "\n\n".join(content)
-
-            # Check if content exceeds 1000 characters
-            if len(full_content) > 1000:
-                # Truncate content and add ellipsis
-                truncated_content = full_content[:997] + "..."
-                formatted_content += f"💬 <blockquote>{html.escape(truncated_content)}</blockquote>\n\n"
-            else:
-                formatted_content += f"💬 <blockquote>{html.escape(full_content)}</blockquote>\n\n"
+            # Content is already rendered to HTML and cut to the preview limit
+            formatted_content += f"💬 <blockquote>{content}</blockquote>\n\n"
 
             keyboard = [
                 [InlineKeyboardButton("View full content", url=url)],
-                [InlineKeyboardButton("✅ Approve", callback_data=f'approve:{page["id"]}')]
+                [InlineKeyboardButton("✅ Approve", callback_data=f'approve:{page.id}')]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
             return formatted_content, reply_markup
         except Exception as e:
-            print(f"Error formatting content for Telegram: {str(e)}")
+            logger.error("Error formatting content for Telegram: %s", e)
+            return None, None
+
+    def format_digest_entry(self, page, number):
+        # One numbered entry of a digest message plus its own keyboard row
+        try:
+            title = html.escape(page.title)
+            formatted_content = f"{number}. 📝 <b>{title}</b>\n💬 <blockquote>{page.content}</blockquote>"
+            row = [
+                InlineKeyboardButton(f"{number}. View", url=page.url),
+                InlineKeyboardButton(f"✅ Approve {number}", callback_data=f'approve:{page.id}')
+            ]
+            return formatted_content, row
+        except Exception as e:
+            logger.error("Error formatting digest entry for Telegram: %s", e)
             return None, None
 
     async def update_item_status(self, item_id, new_status):
         try:
-            await asyncio.to_thread(
-                self.client.pages.update,
+            await self.client.pages.update(
                 page_id=item_id,
                 properties={"Status": {"status": {"name": new_status}}}
             )
             return True
         except Exception as e:
-            print(f"Error updating Notion item status: {str(e)}")
+            logger.error("Error updating Notion item status: %s", e)
             return False
 
-    def print_database_schema(self):
+    async def print_database_schema(self):
         try:
-            database = self.client.databases.retrieve(database_id=self.database_id)
+            database = await self.client.databases.retrieve(database_id=self.database_id)
+            await self.compile_schema(database)
             print("\nDatabase properties:")
             for prop, details in database['properties'].items():
                 print(f"- {prop}: {details['type']}")
         except Exception as e:
-            print(f"Error fetching database schema: {str(e)}")
+            logger.error("Error fetching database schema: %s", e)
 
     async def get_random_quote(self):
         try:
-            response = await asyncio.to_thread(
-                self.client.databases.query,
-                database_id=self.database_id,
-                filter={
-                    "property": "Type",
-                    "select": {
-                        "equals": "Quote"
-                    }
-                }
-            )
-            
-            if response['results']:
-                quote = random.choice(response['results'])
-                quote_text = quote['properties']['Content']['rich_text'][0]['plain_text']
-                author = quote['properties']['Author']['rich_text'][0]['plain_text']
-                return f'"{quote_text}"\n- {author}'
+            await self.quote_pool.ensure_fresh()
+            quote = self.quote_pool.choice()
+            if quote:
+                return quote
             else:
                 return "No quotes found in the database."
         except Exception as e:
-            print(f"Error fetching quote: {str(e)}")
+            logger.error("Error fetching quote: %s", e)
             return "Error fetching quote."
 
     async def get_scheduled_items(self):
@@ -185,12 +470,41 @@ class NotionHandler:
                     }
                 ]
             }
-            response = self.client.databases.query(**filter_params, database_id=self.database_id, page_size=self.max_items_per_check)
-            return response['results']
+            items = []
+            async with aclosing(self.iter_database_query(self.max_items_per_check, **filter_params)) as batches:
+                async for results in batches:
+                    items.extend(await self.extract_pages_content(await self.project_pages(results)))
+            return items
         except Exception as e:
-            print(f"Error fetching scheduled items: {str(e)}")
+            logger.error("Error fetching scheduled items: %s", e)
             return []
 
+def create_notion_client(token, base_url=None):
+    # One pooled keep-alive session shared by every Notion call for the life of the bot
+    http = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=NOTION_POOL_SIZE,
+            max_keepalive_connections=NOTION_POOL_SIZE,
+            keepalive_expiry=NOTION_KEEPALIVE_EXPIRY
+        )
+    )
+    options = {"auth": token}
+    if base_url:
+        options["base_url"] = base_url
+    return RateLimitedAsyncClient(
+        rate=NOTION_RATE_LIMIT,
+        burst=max(1, int(NOTION_RATE_LIMIT)),
+        max_retries=NOTION_MAX_RETRIES,
+        client=http,
+        **options
+    )
+
+def parse_notion_time(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
 def escape_markdown(text):
     escape_chars = r'_*[]()~`>#+-=|{}.!'
     return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', str(text))
\ No newline at end of file
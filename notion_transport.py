@@ -0,0 +1,125 @@
+import asyncio
+import copy
+import json
+import logging
+import random
+import time
+import httpx
+from notion_client import AsyncClient
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from rate_limit import TokenBucket
+from metrics import endpoint_label, notion_attempts, notion_request_seconds
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient_error(error):
+    if isinstance(error, HTTPResponseError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (RequestTimeoutError, httpx.TransportError))
+
+
+def is_read_request(path, method):
+    return method == 'GET' or (method == 'POST' and (path.endswith('/query') or path == 'search'))
+
+
+class RateLimitedAsyncClient(AsyncClient):
+    # Every request shares one token bucket, is retried on 429/5xx and timeouts,
+    # and identical reads already in flight are served from the same response
+    def __init__(self, rate=3.0, burst=3, max_retries=5, backoff_base=0.5, backoff_cap=30.0, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = TokenBucket(rate, capacity=burst, name='notion')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.in_flight = {}
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+
+    async def request(self, path, method, query=None, body=None, auth=None):
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            result = await self._request(path, method, query, body, auth)
+            outcome = 'ok'
+            return result
+        finally:
+            notion_request_seconds.observe(
+                time.perf_counter() - started, method=method, endpoint=endpoint_label(path), outcome=outcome
+            )
+
+    async def _request(self, path, method, query, body, auth):
+        if not is_read_request(path, method):
+            return await self._send_with_retry(path, method, query, body, auth)
+
+        key = (method, path, json.dumps(query, sort_keys=True), json.dumps(body, sort_keys=True), auth)
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # Callers mutate the returned dicts, so joiners get their own copy
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(self._send_with_retry(path, method, query, body, auth))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self.in_flight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    async def _send_with_retry(self, path, method, query, body, auth):
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            self.requests += 1
+            endpoint = endpoint_label(path)
+            try:
+                result = await super().request(path, method, query, body, auth)
+                notion_attempts.inc(endpoint=endpoint, result='ok')
+                return result
+            except HTTPResponseError as e:
+                notion_attempts.inc(endpoint=endpoint, result=str(e.status))
+                if e.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    raise
+                delay = retry_after_seconds(e.headers)
+                if e.status == 429:
+                    self.rate_limited += 1
+                    delay = delay if delay is not None else self._backoff(attempt)
+                    self.bucket.block(delay)
+                elif delay is None:
+                    delay = self._backoff(attempt)
+            except (RequestTimeoutError, httpx.TransportError):
+                notion_attempts.inc(endpoint=endpoint, result='transport_error')
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            attempt += 1
+            self.retries += 1
+            logger.info("Retrying Notion %s %s in %.1fs (attempt %d)", method, path, delay, attempt)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt):
+        # Full jitter keeps several clients from retrying in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,113 @@
+from dataclasses import dataclass, replace
+import hashlib
+import json
+
+STATUS_PROPERTY = "Status"
+
+
+@dataclass(frozen=True, slots=True)
+class PageRecord:
+    id: str
+    url: str
+    title: str
+    status: str
+    last_edited_time: str
+    content: str = ""
+    # Extra (name, value) pairs for properties that routing filters need
+    fields: tuple = ()
+
+    def with_content(self, content):
+        return replace(self, content=content)
+
+    def field(self, name):
+        for field_name, value in self.fields:
+            if field_name == name:
+                return value
+        return None
+
+
+def digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+def fields_fingerprint(record):
+    # What a post shows or is routed on; status is left out since only Done pages are fetched
+    return digest(json.dumps([record.title, record.url, record.fields], ensure_ascii=False, default=str))
+
+
+def content_fingerprint(content):
+    # Whitespace-only edits to the rendered preview do not count
+    return digest(' '.join(content.split()))
+
+
+def fingerprint(record):
+    return fields_fingerprint(record), content_fingerprint(record.content)
+
+
+class SchemaChanged(Exception):
+    pass
+
+
+def plain_text(rich_text):
+    return "".join(run.get('plain_text', '') for run in rich_text or [])
+
+
+def compile_field_reader(name, details):
+    kind = details['type']
+    if kind in ('select', 'status'):
+        return lambda page_properties: (page_properties[name][kind] or {}).get('name')
+    if kind == 'multi_select':
+        return lambda page_properties: tuple(option['name'] for option in page_properties[name]['multi_select'])
+    if kind in ('title', 'rich_text'):
+        return lambda page_properties: plain_text(page_properties[name][kind])
+    if kind in ('checkbox', 'number', 'url', 'email'):
+        return lambda page_properties: page_properties[name][kind]
+    return lambda page_properties: None
+
+
+def compile_status_reader(properties):
+    details = properties.get(STATUS_PROPERTY)
+    if details is None or details['type'] not in ('status', 'select'):
+        return lambda page_properties: None
+    kind = details['type']
+
+    def read_status(page_properties):
+        value = page_properties[STATUS_PROPERTY][kind]
+        return value['name'] if value else None
+
+    return read_status
+
+
+class SchemaExtractor:
+    # Built once from the database schema; only the properties the bot reads are kept
+    def __init__(self, properties, extra_fields=()):
+        self.title_property = next(
+            (name for name, details in properties.items() if details['type'] == 'title'), None
+        )
+        if self.title_property is None:
+            raise SchemaChanged("Database has no title property")
+        self.read_status = compile_status_reader(properties)
+        self.field_readers = tuple(
+            (name, compile_field_reader(name, properties[name]))
+            for name in extra_fields
+            if name in properties
+        )
+        self.signature = tuple(sorted((name, details['type']) for name, details in properties.items()))
+
+    def project(self, page, content=""):
+        properties = page['properties']
+        try:
+            title = plain_text(properties[self.title_property]['title'])
+            status = self.read_status(properties)
+            fields = tuple((name, read(properties)) for name, read in self.field_readers)
+        except KeyError as e:
+            raise SchemaChanged(f"Page {page['id']} is missing property {e}") from e
+        return PageRecord(
+            id=page['id'],
+            url=page['url'],
+            title=title,
+            status=status,
+            last_edited_time=page['last_edited_time'],
+            content=content,
+            fields=fields
+        )
@@ -0,0 +1,48 @@
+class AdaptiveInterval:
+    # Drops to the floor as soon as a check finds items and backs off
+    # geometrically while the database stays idle, never past the ceiling
+    def __init__(self, floor, ceiling, backoff=2.0, initial=None):
+        if floor <= 0 or ceiling < floor:
+            raise ValueError(f"Invalid polling bounds: floor={floor}, ceiling={ceiling}")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.backoff = max(backoff, 1.0)
+        self.current = self.clamp(initial if initial is not None else floor)
+        self.idle_checks = 0
+
+    def clamp(self, seconds):
+        return min(max(seconds, self.floor), self.ceiling)
+
+    def record(self, found, succeeded=True):
+        if found:
+            self.idle_checks = 0
+            self.current = self.floor
+        elif succeeded:
+            self.idle_checks += 1
+            self.current = self.clamp(self.current * self.backoff)
+        # A failed check says nothing about activity, so it keeps the current pace
+        return self.current
+
+
+class DatabasePoller:
+    # Each database reschedules itself only after its cycle has finished,
+    # so there is never more than one poll in flight per database
+    def __init__(self, scheduler, database, interval, lease=None):
+        self.scheduler = scheduler
+        self.database = database
+        self.interval = interval
+        self.lease = lease
+
+    @property
+    def name(self):
+        return f"poll:{self.database.handler.database_id}"
+
+    async def poll(self):
+        # The renew job keeps a held lease alive; a poll without one tries to take it
+        # itself (within this instance's share), so a poller driven on its own still runs
+        if self.lease and not self.lease.held and not self.lease.try_take():
+            # Standby: check back soon so a failover picks up without a long wait
+            self.interval.current = self.interval.floor
+            return self.interval.current
+        found = await self.scheduler.check_database(self.database)
+        return self.interval.record(found, self.database.last_cycle_succeeded)
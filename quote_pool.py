@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+QUOTE_FILTER = {
+    "property": "Type",
+    "select": {
+        "equals": "Quote"
+    }
+}
+
+logger = logging.getLogger(__name__)
+
+
+def is_quote(page):
+    select = page.get('properties', {}).get('Type', {}).get('select')
+    return bool(select) and select.get('name') == 'Quote'
+
+
+def quote_text(page):
+    try:
+        properties = page['properties']
+        content = "".join(run['plain_text'] for run in properties['Content']['rich_text'])
+        author = "".join(run['plain_text'] for run in properties['Author']['rich_text'])
+    except (KeyError, TypeError):
+        return None
+    if not content:
+        return None
+    return f'"{content}"\n- {author}'
+
+
+class QuotePool:
+    # Quotes live in a flat list so a uniform random pick is O(1); positions maps
+    # page IDs to list slots so edits and removals are O(1) as well
+    def __init__(self, handler, refresh_interval=300, full_reload_interval=24 * 60 * 60):
+        self.handler = handler
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.ids = []
+        self.texts = []
+        self.positions = {}
+        self.synced_at = None
+        self.refreshed = 0.0
+        self.loaded = 0.0
+        self.lock = asyncio.Lock()
+        self.refresh_task = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def choice(self):
+        if not self.texts:
+            return None
+        return random.choice(self.texts)
+
+    async def ensure_fresh(self):
+        if not self.loaded:
+            async with self.lock:
+                if not self.loaded:
+                    await self.load()
+            return
+        if time.monotonic() - self.refreshed < self.refresh_interval:
+            return
+        # Keep serving the current snapshot while the refresh runs
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self):
+        try:
+            async with self.lock:
+                if time.monotonic() - self.loaded > self.full_reload_interval:
+                    # Archived pages never show up in deltas, so rebuild from scratch now and then
+                    await self.load()
+                else:
+                    await self.refresh()
+        except Exception as e:
+            logger.error("Error refreshing quote pool: %s", e)
+
+    async def load(self):
+        started = sync_start_time()
+        ids = []
+        texts = []
+        async for pages in self.handler.iter_database_query(filter=QUOTE_FILTER):
+            for page in pages:
+                text = quote_text(page)
+                if text:
+                    ids.append(page['id'])
+                    texts.append(text)
+        # Swap the new snapshot in all at once
+        self.ids, self.texts = ids, texts
+        self.positions = {page_id: index for index, page_id in enumerate(ids)}
+        self.synced_at = started
+        self.refreshed = self.loaded = time.monotonic()
+
+    async def refresh(self):
+        started = sync_start_time()
+        changes = []
+        # No Type filter: a page edited away from Quote has to be dropped from the pool
+        query = {
+            "filter": {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {
+                    "on_or_after": self.synced_at
+                }
+            }
+        }
+        async for pages in self.handler.iter_database_query(**query):
+            for page in pages:
+                text = quote_text(page) if is_quote(page) and not page.get('archived') else None
+                changes.append((page['id'], text))
+        # Apply without awaiting so readers never see a half-applied delta
+        for page_id, text in changes:
+            if text:
+                self._put(page_id, text)
+            else:
+                self._remove(page_id)
+        self.synced_at = started
+        self.refreshed = time.monotonic()
+
+    def _put(self, page_id, text):
+        index = self.positions.get(page_id)
+        if index is None:
+            self.positions[page_id] = len(self.ids)
+            self.ids.append(page_id)
+            self.texts.append(text)
+        else:
+            self.texts[index] = text
+
+    def _remove(self, page_id):
+        index = self.positions.pop(page_id, None)
+        if index is None:
+            return
+        last_id = self.ids.pop()
+        last_text = self.texts.pop()
+        if index < len(self.ids):
+            self.ids[index] = last_id
+            self.texts[index] = last_text
+            self.positions[last_id] = index
+
+
+def sync_start_time():
+    # Notion rounds last_edited_time to the minute, so the next delta starts a minute early
+    return (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
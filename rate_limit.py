@@ -0,0 +1,40 @@
+import asyncio
+import time
+from metrics import rate_limit_wait_seconds
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1, name=None):
+        self.rate = rate
+        self.name = name
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        started = time.monotonic()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.name:
+                        rate_limit_wait_seconds.observe(now - started, limiter=self.name)
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds):
+        # The server asked us to back off; nothing leaves this bucket until then
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
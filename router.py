@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import time
+from metrics import cycle_seconds, items_failed, items_fetched, items_sent
+
+logger = logging.getLogger(__name__)
+
+
+def compile_route_filter(conditions):
+    # Conditions are ANDed; each one tests a single projected property locally
+    checks = []
+    for condition in conditions:
+        name = condition['property']
+        if 'equals' in condition:
+            checks.append(lambda item, name=name, value=condition['equals']: item.field(name) == value)
+        elif 'not_equals' in condition:
+            checks.append(lambda item, name=name, value=condition['not_equals']: item.field(name) != value)
+        elif 'in' in condition:
+            checks.append(lambda item, name=name, values=frozenset(condition['in']): item.field(name) in values)
+        elif 'contains' in condition:
+            checks.append(lambda item, name=name, value=condition['contains']: value in (item.field(name) or ()))
+        else:
+            raise ValueError(f"Unsupported route filter condition: {condition}")
+    return lambda item: all(check(item) for check in checks)
+
+
+class Route:
+    def __init__(self, name, chats, conditions=(), max_concurrency=1):
+        self.name = name
+        self.chats = [str(chat) for chat in chats]
+        self.conditions = list(conditions)
+        self.matches = compile_route_filter(self.conditions)
+        # Bounds in-flight sends so one busy route cannot hog the send queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def fields(self):
+        return {condition['property'] for condition in self.conditions}
+
+    @property
+    def targets(self):
+        return [(chat, f"{self.name}:{chat}") for chat in self.chats]
+
+
+class DatabaseRoutes:
+    def __init__(self, handler, routes):
+        self.handler = handler
+        self.routes = routes
+        self.last_cycle_succeeded = True
+        handler.delivery_scopes = tuple(scope for route in routes for _, scope in route.targets)
+
+
+def load_routes(path):
+    # Returns {database_id: (options, [Route, ...])} from a JSON routing file
+    with open(path) as config_file:
+        config = json.load(config_file)
+    databases = {}
+    for name, options in config['databases'].items():
+        databases[name] = (options, [])
+    for route_config in config['routes']:
+        options, routes = databases[route_config['database']]
+        routes.append(Route(
+            route_config['name'],
+            route_config['chats'],
+            route_config.get('filter', []),
+            route_config.get('max_concurrency', 1)
+        ))
+    return {options['id']: (options, routes) for options, routes in databases.values() if routes}
+
+
+class RouteScheduler:
+    # Each database is fetched once per cycle and its items fanned out to every
+    # matching route. Databases run side by side so a slow one cannot stall the rest.
+    def __init__(self, databases, send, claims=None, digest=None):
+        self.databases = databases
+        self.send = send
+        self.claims = claims
+        self.digest = digest
+
+    async def run_cycle(self):
+        results = await asyncio.gather(*(self.check_database(database) for database in self.databases))
+        return sum(results)
+
+    async def check_database(self, database):
+        try:
+            return await self.run_database(database)
+        except Exception as e:
+            logger.error(f"Error checking database {database.handler.database_id}: {str(e)}")
+            database.last_cycle_succeeded = False
+            return 0
+
+    async def run_database(self, database):
+        handler = database.handler
+        found = 0
+        deliveries = []
+        started = time.perf_counter()
+        # The handler holds its watermark until every delivery of the cycle has an outcome
+        async for item in handler.iter_recently_done_content(settle=lambda: asyncio.gather(*deliveries)):
+            found += 1
+            items_fetched.inc(database=handler.database_id)
+            for route in database.routes:
+                if not route.matches(item):
+                    # Nothing is owed to these targets for this version; recording that keeps the
+                    # item from counting as undelivered, and against the check cap, every cycle
+                    for _, scope in route.targets:
+                        handler.mark_delivered(item, scope)
+                    continue
+                for chat, scope in route.targets:
+                    if handler.is_delivered(item, scope):
+                        continue
+                    if handler.is_unchanged(item, scope):
+                        # Re-fetched for another target that is still owed it; this one already has it
+                        handler.skip_unchanged(item, scope)
+                        continue
+                    if self.claims and not self.claims.claim(item, scope):
+                        # Another instance is delivering this one
+                        continue
+                    await route.semaphore.acquire()
+                    deliveries.append(asyncio.create_task(self.deliver(handler, route, chat, scope, item)))
+        # Read straight away: once the cycle lock is released a manual /check may reset the flag
+        database.last_cycle_succeeded = handler.last_cycle_succeeded
+        cycle_seconds.observe(time.perf_counter() - started, database=handler.database_id)
+        if not database.last_cycle_succeeded:
+            logger.warning(f"Check of database {handler.database_id} stopped early; the watermark was kept before the failed item")
+        return found
+
+    async def deliver(self, handler, route, chat, scope, item):
+        holding_slot = True
+        try:
+            if self.digest:
+                # Buffering is instant, so the route's slot is freed before the digest goes out
+                receipt = self.digest.add(chat, item)
+                route.semaphore.release()
+                holding_slot = False
+                delivered = await receipt
+            else:
+                delivered = await self.send(chat, item)
+            if delivered:
+                handler.mark_delivered(item, scope)
+                items_sent.inc(route=route.name)
+                return
+        except Exception as e:
+            logger.error(f"Error delivering {item.id} to route {route.name} chat {chat}: {str(e)}")
+        finally:
+            if holding_slot:
+                route.semaphore.release()
+            if self.claims:
+                self.claims.release(item, scope)
+        handler.mark_failed(item, scope)
+        items_failed.inc(route=route.name)
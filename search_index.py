@@ -0,0 +1,274 @@
+import bisect
+from itertools import zip_longest
+import heapq
+import html
+import json
+import math
+import re
+import sqlite3
+import threading
+
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r'\w+')
+
+# Title words count this many times over body words
+TITLE_WEIGHT = 3
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# A trailing word this long also matches as a prefix, expanding to at most MAX_PREFIX_TERMS terms
+MIN_PREFIX = 3
+MAX_PREFIX_TERMS = 32
+SNIPPET_LENGTH = 120
+# Above this many pages matching every word, only the most promising are fully scored
+PRESELECT = 250
+# How deep a prefix word's merged ranking is scanned when it is the rarest word
+SCAN_DEPTH = 4 * PRESELECT
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+def plain_text(content):
+    return html.unescape(TAG_RE.sub(' ', content or ''))
+
+
+def term_counts(title, text):
+    counts = {}
+    for term in tokenize(title):
+        counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def group_weight(group):
+    if len(group) == 1:
+        idf, posting = group[0][1:]
+        return lambda number: idf * posting.get(number, 0.0)
+    return lambda number: max(idf * posting.get(number, 0.0) for _, idf, posting in group)
+
+
+def group_contains(group, number):
+    return any(number in posting for _, _, posting in group)
+
+
+class IndexedPage:
+    __slots__ = ('page_id', 'last_edited_time', 'title', 'url', 'snippet', 'terms', 'length')
+
+    def __init__(self, page_id, last_edited_time, title, url, snippet, terms):
+        self.page_id = page_id
+        self.last_edited_time = last_edited_time
+        self.title = title
+        self.url = url
+        self.snippet = snippet
+        self.terms = terms
+        self.length = sum(terms.values())
+
+
+class SearchIndex:
+    # In-memory inverted index (term -> {page number: BM25 impact}) over
+    # titles and extracted content. Pages are replaced whole when their
+    # last_edited_time changes; an optional SQLite file keeps the term counts so
+    # the index is rebuilt on start without touching Notion.
+    def __init__(self, disk_path=None):
+        self.pages = {}
+        self.numbers = {}
+        self.postings = {}
+        self.vocabulary = []
+        self.rankings = {}
+        self.total_length = 0
+        self.next_number = 0
+        self.disk = None
+        self.lock = threading.Lock()
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self.disk.execute("PRAGMA journal_mode=WAL")
+            self.disk.execute("""
+                CREATE TABLE IF NOT EXISTS search_pages (
+                    page_id TEXT PRIMARY KEY,
+                    last_edited_time TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    snippet TEXT NOT NULL,
+                    terms TEXT NOT NULL
+                )
+            """)
+            self.load()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def load(self):
+        with self.lock:
+            rows = self.disk.execute(
+                "SELECT page_id, last_edited_time, title, url, snippet, terms FROM search_pages"
+            ).fetchall()
+        for page_id, last_edited_time, title, url, snippet, terms in rows:
+            self._add(IndexedPage(page_id, last_edited_time, title, url, snippet, json.loads(terms)))
+        # Rank the common terms up front so the first query for them is as fast as the rest
+        for term, posting in self.postings.items():
+            if len(posting) > PRESELECT:
+                self.ranked(term)
+
+    def put(self, page):
+        # Takes a PageRecord; content is the rendered HTML preview
+        current = self.numbers.get(page.id)
+        if current is not None and self.pages[current].last_edited_time == page.last_edited_time:
+            return
+        text = plain_text(page.content)
+        indexed = IndexedPage(
+            page.id,
+            page.last_edited_time,
+            page.title,
+            page.url,
+            ' '.join(text.split())[:SNIPPET_LENGTH],
+            term_counts(page.title, text)
+        )
+        self.remove(page.id, persist=False)
+        self._add(indexed)
+        if self.disk:
+            with self.lock:
+                self.disk.execute(
+                    "INSERT INTO search_pages (page_id, last_edited_time, title, url, snippet, terms) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(page_id) DO UPDATE SET last_edited_time = excluded.last_edited_time, "
+                    "title = excluded.title, url = excluded.url, snippet = excluded.snippet, terms = excluded.terms",
+                    (indexed.page_id, indexed.last_edited_time, indexed.title, indexed.url, indexed.snippet,
+                     json.dumps(indexed.terms, separators=(',', ':')))
+                )
+
+    def _add(self, indexed):
+        number = self.next_number
+        self.next_number += 1
+        self.pages[number] = indexed
+        self.numbers[indexed.page_id] = number
+        self.total_length += indexed.length
+        # Postings hold the BM25 term-frequency part precomputed against the average
+        # page length at insert time, so a query only multiplies by idf and adds
+        average_length = self.total_length / len(self.pages)
+        norm = K1 * (1 - B + B * indexed.length / average_length)
+        for term, count in indexed.terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            impact = posting[number] = count * (K1 + 1) / (count + norm)
+            ranking = self.rankings.get(term)
+            if ranking is not None:
+                bisect.insort(ranking, number, key=lambda other: -posting.get(other, impact))
+
+    def remove(self, page_id, persist=True):
+        number = self.numbers.pop(page_id, None)
+        if number is not None:
+            indexed = self.pages.pop(number)
+            self.total_length -= indexed.length
+            for term in indexed.terms:
+                posting = self.postings[term]
+                ranking = self.rankings.get(term)
+                if ranking is not None:
+                    impact = posting[number]
+                    position = bisect.bisect_left(ranking, -impact, key=lambda other: -posting[other])
+                    while ranking[position] != number:
+                        position += 1
+                    del ranking[position]
+                del posting[number]
+                if not posting:
+                    del self.postings[term]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+                    self.rankings.pop(term, None)
+        if persist and self.disk:
+            with self.lock:
+                self.disk.execute("DELETE FROM search_pages WHERE page_id = ?", (page_id,))
+
+    def expand_prefix(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def ranked(self, term):
+        # Page numbers by descending impact; built on first use, then kept in order as pages come and go
+        ranking = self.rankings.get(term)
+        if ranking is None:
+            posting = self.postings[term]
+            ranking = self.rankings[term] = sorted(posting, key=posting.__getitem__, reverse=True)
+        return ranking
+
+    def query_groups(self, query):
+        # One group of (term, idf, posting) per query word; the last word also matches
+        # as a prefix so inline queries rank sensibly while the user is still typing
+        words = tokenize(query)
+        groups = []
+        count = len(self.pages)
+        for index, word in enumerate(words):
+            if index == len(words) - 1 and not query[-1:].isspace() and len(word) >= MIN_PREFIX:
+                terms = self.expand_prefix(word) or [word]
+            else:
+                terms = [word]
+            group = []
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting:
+                    idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    group.append((term, idf, posting))
+            if group:
+                groups.append(group)
+        return groups
+
+    def group_ranking(self, group, depth):
+        if len(group) == 1:
+            return self.ranked(group[0][0])[:depth]
+        # A prefix's expansions are interleaved best first rather than fully re-sorted;
+        # the candidates are scored properly afterwards anyway
+        merged = {}
+        for rankings in zip_longest(*(self.ranked(term)[:depth] for term, _, _ in group)):
+            for number in rankings:
+                if number is not None:
+                    merged[number] = None
+            if len(merged) >= depth:
+                break
+        return list(merged)[:depth]
+
+    def search(self, query, limit=10):
+        if not self.pages:
+            return []
+        groups = self.query_groups(query)
+        if not groups:
+            return []
+        weights = [group_weight(group) for group in groups]
+        # The rarest word drives the scan; the others only filter
+        order = sorted(range(len(groups)), key=lambda index: sum(len(posting) for _, _, posting in groups[index]))
+        rarest, others = groups[order[0]], [groups[index] for index in order[1:]]
+
+        def score(number):
+            return sum(weight(number) for weight in weights)
+
+        # Walk the rarest word's pages best first and keep those containing every word,
+        # stopping once enough have been found to rank
+        candidates = []
+        for number in self.group_ranking(rarest, len(self.pages) if len(rarest) == 1 else SCAN_DEPTH):
+            if all(group_contains(group, number) for group in others):
+                candidates.append(number)
+                if len(candidates) >= PRESELECT:
+                    break
+        best = heapq.nlargest(limit, candidates, key=score)
+
+        if len(best) < limit:
+            # Pad with pages matching only some of the words, best single-word matches first
+            seen = set(best)
+            partial = {number for group in groups for number in self.group_ranking(group, limit) if number not in seen}
+            best.extend(heapq.nlargest(limit - len(best), partial, key=score))
+        return [self.pages[number] for number in best]
+
+    def stats(self):
+        return {"pages": len(self.pages), "terms": len(self.postings)}
+
+    def close(self):
+        if self.disk:
+            with self.lock:
+                self.disk.close()
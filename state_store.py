@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Several bot instances may share this file; wait for each other's writes
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # Fingerprints were first kept per page rather than per target; they are only a
+        # shortcut, so the old table is dropped instead of migrated
+        if self.conn.execute("SELECT 1 FROM pragma_table_info('fingerprints') WHERE name = 'page_id'").fetchone() and \
+                not self.conn.execute("SELECT 1 FROM pragma_table_info('fingerprints') WHERE name = 'scope'").fetchone():
+            self.conn.execute("DROP TABLE fingerprints")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS delivered (
+                scope TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                last_edited_time TEXT NOT NULL,
+                delivered_at TEXT NOT NULL,
+                PRIMARY KEY (scope, page_id)
+            );
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                scope TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                fields BLOB NOT NULL,
+                content BLOB NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (scope, page_id)
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS claims (
+                scope TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                last_edited_time TEXT NOT NULL,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (scope, page_id)
+            );
+            CREATE TABLE IF NOT EXISTS content_failures (
+                page_id TEXT PRIMARY KEY,
+                last_edited_time TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+        """)
+
+    def get_checkpoint(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_checkpoint(self, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO checkpoints (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    # A scope is one delivery target (route and chat), so each target keeps its own ledger
+    def is_delivered(self, page_id, last_edited_time, scope=''):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM delivered WHERE scope = ? AND page_id = ? AND last_edited_time = ?",
+                (scope, page_id, last_edited_time)
+            ).fetchone()
+        return row is not None
+
+    def mark_delivered(self, page_id, last_edited_time, scope=''):
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO delivered (scope, page_id, last_edited_time, delivered_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(scope, page_id) DO UPDATE SET last_edited_time = excluded.last_edited_time, "
+                "delivered_at = excluded.delivered_at",
+                (scope, page_id, last_edited_time, now)
+            )
+
+    # Fingerprint of the version last sent to each target, two 8-byte digests (see
+    # page_record.fingerprint). Empty digests mark a target whose last send failed.
+    def get_fingerprints(self, page_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT scope, fields, content FROM fingerprints WHERE page_id = ?", (page_id,)
+            ).fetchall()
+        return {scope: (bytes(fields), bytes(content)) for scope, fields, content in rows}
+
+    def set_fingerprint(self, page_id, scope, fields, content):
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO fingerprints (scope, page_id, fields, content, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(scope, page_id) DO UPDATE SET fields = excluded.fields, content = excluded.content, "
+                "updated_at = excluded.updated_at",
+                (scope, page_id, fields, content, now)
+            )
+
+    # Transient failures to fetch a page's content, counted per edit of the page
+    def record_content_failure(self, page_id, last_edited_time):
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            return self.conn.execute(
+                "INSERT INTO content_failures (page_id, last_edited_time, attempts, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET "
+                "attempts = CASE WHEN content_failures.last_edited_time = excluded.last_edited_time "
+                "THEN content_failures.attempts + 1 ELSE 1 END, "
+                "last_edited_time = excluded.last_edited_time, updated_at = excluded.updated_at "
+                "RETURNING attempts",
+                (page_id, last_edited_time, now)
+            ).fetchone()[0]
+
+    def touch_fingerprints(self, page_id):
+        # A page that keeps being touched without changing keeps its fingerprints
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self.conn.execute("UPDATE fingerprints SET updated_at = ? WHERE page_id = ?", (now, page_id))
+
+    def prune_delivered(self, retention_days, fingerprint_retention_days=None):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+        with self.lock:
+            self.conn.execute("DELETE FROM delivered WHERE delivered_at < ?", (cutoff,))
+            # Fingerprints are what stop a late touch from reposting, so they are kept far
+            # longer than the ledger (or forever without a retention)
+            if fingerprint_retention_days:
+                fingerprint_cutoff = (datetime.now(timezone.utc) - timedelta(days=fingerprint_retention_days)).isoformat()
+                self.conn.execute("DELETE FROM fingerprints WHERE updated_at < ?", (fingerprint_cutoff,))
+            self.conn.execute("DELETE FROM claims WHERE expires_at < ?", (time.time(),))
+            self.conn.execute("DELETE FROM content_failures WHERE updated_at < ?", (cutoff,))
+
+    # Leases and claims use wall-clock expiry so that separate processes agree on it.
+    # Each is a single upsert that only wins when the row is free, expired or already ours.
+    def acquire_lease(self, name, holder, ttl):
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl, now)
+            )
+        return cursor.rowcount == 1
+
+    def count_leases(self, prefix):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE name LIKE ? AND expires_at >= ?", (prefix + '%', time.time())
+            ).fetchone()[0]
+
+    def release_lease(self, name, holder):
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def claim_delivery(self, page_id, last_edited_time, scope, holder, ttl):
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO claims (scope, page_id, last_edited_time, holder, expires_at) "
+                "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS ("
+                "    SELECT 1 FROM delivered WHERE scope = ? AND page_id = ? AND last_edited_time = ?"
+                ") "
+                "ON CONFLICT(scope, page_id) DO UPDATE SET last_edited_time = excluded.last_edited_time, "
+                "holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE claims.holder = excluded.holder OR claims.expires_at < ?",
+                (scope, page_id, last_edited_time, holder, now + ttl, scope, page_id, last_edited_time, now)
+            )
+        return cursor.rowcount == 1
+
+    def release_claim(self, page_id, scope, holder):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM claims WHERE scope = ? AND page_id = ? AND holder = ?", (scope, page_id, holder)
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
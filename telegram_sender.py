@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import telegram
+from rate_limit import TokenBucket
+from metrics import telegram_request_seconds
+
+logger = logging.getLogger(__name__)
+
+# Lower values are sent first
+INTERACTIVE = 0
+PERIODIC = 10
+
+
+class ChatQueue:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+
+class SendScheduler:
+    def __init__(self, global_rate=30, chat_rate=1.0, group_rate=20 / 60, max_retries=5):
+        self.bot = None
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate, name='telegram_global')
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.queues = {}
+        self.sequence = itertools.count()
+        self.closing = False
+
+    def start(self, bot):
+        self.bot = bot
+        self.closing = False
+
+    def pending(self):
+        return sum(len(queue.jobs) for queue in self.queues.values())
+
+    async def send_message(self, chat_id, text, priority=PERIODIC, **kwargs):
+        return await self.submit(chat_id, 'send_message', priority, text=text, **kwargs)
+
+    async def submit(self, chat_id, method, priority, **kwargs):
+        if self.closing or self.bot is None:
+            raise RuntimeError("Send scheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queue(chat_id)
+        heapq.heappush(queue.jobs, (priority, next(self.sequence), 0, method, kwargs, future))
+        queue.wakeup.set()
+        return await future
+
+    def _queue(self, chat_id):
+        key = str(chat_id)
+        queue = self.queues.get(key)
+        if queue is None:
+            # Groups and channels have negative IDs and a much tighter per-minute limit
+            rate = self.group_rate if key.startswith('-') else self.chat_rate
+            queue = ChatQueue(TokenBucket(rate, name='telegram_group' if key.startswith('-') else 'telegram_chat'))
+            queue.task = asyncio.create_task(self._run(chat_id, queue))
+            self.queues[key] = queue
+        return queue
+
+    async def _run(self, chat_id, queue):
+        while True:
+            if not queue.jobs:
+                if self.closing:
+                    return
+                queue.wakeup.clear()
+                await queue.wakeup.wait()
+                continue
+
+            await queue.bucket.acquire()
+            await self.global_bucket.acquire()
+            # Take the highest priority job only after waiting, so late interactive sends win
+            priority, sequence, attempts, method, kwargs, future = heapq.heappop(queue.jobs)
+            if future.done():
+                continue
+
+            outcome = 'error'
+            started = time.perf_counter()
+            try:
+                result = await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+                outcome = 'ok'
+            except telegram.error.RetryAfter as e:
+                outcome = 'retry_after'
+                logger.warning(f"Flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                queue.bucket.block(e.retry_after)
+                heapq.heappush(queue.jobs, (priority, sequence, attempts, method, kwargs, future))
+            except telegram.error.BadRequest as e:
+                future.set_exception(e)
+            except telegram.error.NetworkError as e:
+                if attempts >= self.max_retries:
+                    future.set_exception(e)
+                else:
+                    logger.warning(f"Network error sending to chat {chat_id}, retrying: {str(e)}")
+                    queue.bucket.block(min(2 ** attempts, 30))
+                    heapq.heappush(queue.jobs, (priority, sequence, attempts + 1, method, kwargs, future))
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                telegram_request_seconds.observe(time.perf_counter() - started, method=method, outcome=outcome)
+
+    async def stop(self, timeout=None):
+        # Stop accepting new sends and let queued ones drain
+        self.closing = True
+        tasks = [queue.task for queue in self.queues.values()]
+        for queue in self.queues.values():
+            queue.wakeup.set()
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for queue in self.queues.values():
+            for job in queue.jobs:
+                if not job[-1].done():
+                    job[-1].set_exception(RuntimeError("Send scheduler stopped before delivery"))
+        if pending:
+            logger.warning(f"Dropped unsent messages for {len(pending)} chats on shutdown")
+        self.queues.clear()
@@ -0,0 +1,102 @@
+import html
+import os
+import re
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from block_renderer import BlockRenderer, render_blocks
+
+
+def run(text, **extra):
+    return {"type": "text", "plain_text": text, "annotations": extra.pop('annotations', {}), "href": extra.pop('href', None)}
+
+
+def block(block_type, text='', depth=0, **data):
+    data.setdefault('rich_text', [run(text)] if text else [])
+    return {"id": f"{block_type}-{text}", "type": block_type, "depth": depth, block_type: data}
+
+
+def visible_length(rendered):
+    return len(html.unescape(re.sub(r'<[^>]+>', '', rendered)))
+
+
+class BlockRendererTest(unittest.TestCase):
+    def test_numbering_counts_per_depth(self):
+        rendered = render_blocks([
+            block('numbered_list_item', 'one'),
+            block('numbered_list_item', 'one a', depth=1),
+            block('numbered_list_item', 'one b', depth=1),
+            block('numbered_list_item', 'two'),
+            block('numbered_list_item', 'two a', depth=1),
+        ])
+        self.assertEqual(rendered.split('\n'), [
+            '1. one',
+            '    1. one a',
+            '    2. one b',
+            '2. two',
+            '    1. two a',
+        ])
+
+    def test_numbering_restarts_after_interruption(self):
+        rendered = render_blocks([
+            block('numbered_list_item', 'a'),
+            block('numbered_list_item', 'b'),
+            block('paragraph', 'break'),
+            block('numbered_list_item', 'c'),
+            block('numbered_list_item', 'nested', depth=1),
+            block('bulleted_list_item', 'bullet', depth=1),
+            block('numbered_list_item', 'nested again', depth=1),
+        ])
+        self.assertIn('2. b\n\nbreak\n\n1. c', rendered)
+        self.assertIn('    1. nested\n    • bullet\n    1. nested again', rendered)
+
+    def test_text_and_href_are_escaped(self):
+        rendered = render_blocks([
+            block('paragraph', rich_text=[run('<b> & "x"', href='https://example.com/?a=1&b="2"<')]),
+        ])
+        self.assertEqual(
+            rendered,
+            '<a href="https://example.com/?a=1&amp;b=&quot;2&quot;&lt;">&lt;b&gt; &amp; "x"</a>'
+        )
+
+    def test_bookmark_url_is_escaped(self):
+        rendered = render_blocks([block('bookmark', url='https://example.com/?q="<x>"&y=1', caption=[])])
+        self.assertEqual(
+            rendered,
+            '<a href="https://example.com/?q=&quot;&lt;x&gt;&quot;&amp;y=1">https://example.com/?q="&lt;x&gt;"&amp;y=1</a>'
+        )
+
+    def test_truncation_stays_within_budget(self):
+        blocks = [block('paragraph', f'paragraph number {index} with some text') for index in range(50)]
+        for budget in (1, 10, 37, 100, 250):
+            renderer = BlockRenderer(budget)
+            for item in blocks:
+                renderer.feed(item)
+            rendered = renderer.html()
+            self.assertTrue(renderer.truncated)
+            self.assertTrue(rendered.endswith('…'))
+            # The ellipsis itself is the only thing past the budget
+            self.assertLessEqual(visible_length(rendered) - 1, budget)
+
+    def test_truncation_never_leaves_a_bare_prefix(self):
+        # The budget runs out exactly where the list item's text would start
+        first = block('paragraph', 'x' * 10)
+        for budget in range(11, 20):
+            rendered = render_blocks([first, block('numbered_list_item', 'item text')], budget)
+            self.assertNotRegex(rendered, r'(^|\n)\s*(\d+\.|•)\s*…')
+            self.assertTrue(rendered.endswith('…') or rendered.endswith('item text'))
+
+    def test_truncation_inside_annotated_text_closes_tags(self):
+        rendered = render_blocks([block('paragraph', rich_text=[run('bold words here', annotations={'bold': True})])], 4)
+        self.assertEqual(rendered, '<b>bold</b>…')
+
+    def test_empty_paragraphs_are_skipped(self):
+        rendered = render_blocks([block('paragraph', 'a'), block('paragraph'), block('paragraph', 'b')])
+        self.assertEqual(rendered, 'a\n\nb')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from coordination import DeliveryClaims, Lease, LeaseGroup
+from page_record import PageRecord
+from state_store import StateStore
+
+
+class CoordinationTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.workdir.name, "state.db")
+        # Two connections to one file, like two bot instances
+        self.first = StateStore(path)
+        self.second = StateStore(path)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        self.workdir.cleanup()
+
+    def test_only_one_holder_at_a_time(self):
+        a = Lease(self.first, "poll:db", "a", ttl=30)
+        b = Lease(self.second, "poll:db", "b", ttl=30)
+        self.assertTrue(a.renew())
+        self.assertFalse(b.renew())
+        self.assertTrue(a.held)
+        self.assertFalse(b.held)
+        # Renewing a lease already held succeeds
+        self.assertTrue(a.renew())
+        a.release()
+        self.assertFalse(a.held)
+        self.assertTrue(b.renew())
+
+    def test_expired_lease_is_taken_over(self):
+        a = Lease(self.first, "poll:db", "a", ttl=0.05)
+        b = Lease(self.second, "poll:db", "b", ttl=30)
+        self.assertTrue(a.renew())
+        self.assertFalse(b.renew())
+        time.sleep(0.1)
+        self.assertTrue(b.renew())
+        self.assertFalse(a.renew())
+
+    def test_databases_are_split_between_instances(self):
+        names = [f"poll:db{number}" for number in range(4)]
+        a = LeaseGroup(self.first, "a", ttl=30)
+        b = LeaseGroup(self.second, "b", ttl=0.3)
+        a_leases = [a.lease(name) for name in names]
+        b_leases = [b.lease(name) for name in names]
+
+        a.rebalance()
+        self.assertEqual(sum(lease.held for lease in a_leases), 4)
+        # The newcomer announces itself; the first instance hands back the extras
+        b.rebalance()
+        a.rebalance()
+        b.rebalance()
+        self.assertEqual(sum(lease.held for lease in a_leases), 2)
+        self.assertEqual(sum(lease.held for lease in b_leases), 2)
+        self.assertFalse(any(x.held and y.held for x, y in zip(a_leases, b_leases)))
+        # A standby poll cannot take more than the share
+        self.assertFalse(next(lease for lease in a_leases if not lease.held).try_take())
+
+        # Once the second instance stops renewing, its databases move back
+        time.sleep(0.35)
+        a.rebalance()
+        self.assertEqual(sum(lease.held for lease in a_leases), 4)
+
+    def test_claims(self):
+        item = PageRecord(id="p1", url="u", title="t", status="Done", last_edited_time="2026-10-18T10:00:00.000Z")
+        a = DeliveryClaims(self.first, "a", ttl=30)
+        b = DeliveryClaims(self.second, "b", ttl=30)
+        self.assertTrue(a.claim(item, "all:1"))
+        self.assertFalse(b.claim(item, "all:1"))
+        # Other targets are claimed separately
+        self.assertTrue(b.claim(item, "all:2"))
+        # Once delivered, the item stays refused even after the claim is released
+        self.first.mark_delivered(item.id, item.last_edited_time, "all:1")
+        a.release(item, "all:1")
+        self.assertFalse(b.claim(item, "all:1"))
+        self.assertFalse(a.claim(item, "all:1"))
+
+    def test_expired_claim_is_taken_over(self):
+        item = PageRecord(id="p1", url="u", title="t", status="Done", last_edited_time="2026-10-18T10:00:00.000Z")
+        a = DeliveryClaims(self.first, "a", ttl=0.05)
+        b = DeliveryClaims(self.second, "b", ttl=30)
+        self.assertTrue(a.claim(item, "all:1"))
+        self.assertFalse(b.claim(item, "all:1"))
+        time.sleep(0.1)
+        self.assertTrue(b.claim(item, "all:1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import httpx
+from telegram import InlineKeyboardButton
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('NOTION_RATE_LIMIT', '1000')
+
+from digest import DigestBuffer
+from notion_handler import CONTENT_FAILURE_LIMIT, NotionHandler
+from router import DatabaseRoutes, Route, RouteScheduler
+from state_store import StateStore
+
+SCHEMA = {"properties": {"Name": {"type": "title"}, "Status": {"type": "status"}, "Type": {"type": "select"}}}
+
+
+class FakeNotion:
+    # Serves one database of Done pages, sorted oldest first like the real filter asks for
+    def __init__(self, pages, types=None, broken=()):
+        self.pages = pages
+        self.types = types or {}
+        # Pages whose blocks always answer 502
+        self.broken = set(broken)
+
+    def page(self, page_id, minute):
+        return {
+            "id": page_id,
+            "url": f"https://notion.so/{page_id}",
+            "last_edited_time": f"2026-10-18T10:{minute:02d}:00.000Z",
+            "properties": {
+                "Name": {"title": [{"plain_text": page_id}]},
+                "Status": {"status": {"name": "Done"}},
+                "Type": {"select": {"name": self.types.get(page_id, "Post")}},
+            },
+        }
+
+    def handle(self, request):
+        if request.url.path.endswith('/query'):
+            body = json.loads(request.content)
+            since = body['filter']['and'][1]['last_edited_time']['on_or_after']
+            results = [self.page(page_id, minute) for page_id, minute in self.pages]
+            results = [page for page in results if page['last_edited_time'] >= since.replace('+00:00', '.000Z')]
+            start = int(body.get('start_cursor') or 0)
+            end = min(len(results), start + body['page_size'])
+            return httpx.Response(200, json={
+                "results": results[start:end], "has_more": end < len(results), "next_cursor": str(end)
+            })
+        if '/children' in request.url.path:
+            if request.url.path.split('/')[-2] in self.broken:
+                return httpx.Response(502, json={"object": "error", "status": 502, "code": "bad_gateway", "message": "Bad gateway"})
+            return httpx.Response(200, json={"results": [], "has_more": False})
+        return httpx.Response(200, json=SCHEMA)
+
+
+class DeliveryRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.workdir.name, "state.db"))
+        self.store.set_checkpoint("last_check_time:db", "2026-10-18T09:00:00+00:00")
+        self.notion = FakeNotion([("oldest", 1), ("middle", 2), ("newest", 3)])
+
+    def tearDown(self):
+        self.store.close()
+        self.workdir.cleanup()
+
+    def make_handler(self, max_items=10, extra_fields=()):
+        handler = NotionHandler("token", "db", max_items, state_store=self.store, extra_fields=extra_fields)
+        handler.http._transport = httpx.MockTransport(self.notion.handle)
+        return handler
+
+    def test_failed_send_is_retried_next_cycle(self):
+        sent = []
+        failing = {"oldest"}
+
+        async def send(chat_id, item):
+            sent.append(item.id)
+            return item.id not in failing
+
+        async def run():
+            handler = self.make_handler()
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1"])])], send)
+            first = await scheduler.run_cycle()
+            failing.clear()
+            second = await scheduler.run_cycle()
+            third = await scheduler.run_cycle()
+            await handler.close()
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+        self.assertEqual(first, 3)
+        self.assertEqual(sent.count("oldest"), 2)
+        self.assertEqual(sorted(sent), ["middle", "newest", "oldest", "oldest"])
+        self.assertEqual(third, 0)
+
+    def test_failed_digest_is_resent_next_cycle(self):
+        digests = []
+        outcomes = [False, True]
+
+        def render(item, number):
+            return f"{number}. {item.title}", [InlineKeyboardButton("View", url=item.url)]
+
+        async def send(chat_id, text, reply_markup):
+            digests.append(text)
+            if not outcomes.pop(0):
+                raise RuntimeError("Bot API unavailable")
+
+        async def run():
+            handler = self.make_handler()
+            digest = DigestBuffer(render, send, window=0.05)
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1"])])], None, digest=digest)
+            first = await scheduler.run_cycle()
+            second = await scheduler.run_cycle()
+            third = await scheduler.run_cycle()
+            await handler.close()
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+        self.assertEqual((first, second, third), (3, 3, 0))
+        self.assertEqual(digests, ["1. oldest\n\n2. middle\n\n3. newest"] * 2)
+
+    def test_unrouted_items_do_not_hold_the_cap(self):
+        # A bulk edit leaves every page on one timestamp; only the last matches the route
+        self.notion = FakeNotion([("post1", 1), ("post2", 1), ("quote", 1)], types={"quote": "Quote"})
+        sent = []
+
+        async def send(chat_id, item):
+            sent.append(item.id)
+            return True
+
+        async def run():
+            handler = self.make_handler(max_items=2, extra_fields=("Type",))
+            route = Route("quotes", ["1"], [{"property": "Type", "equals": "Quote"}])
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [route])], send)
+            for _ in range(3):
+                await scheduler.run_cycle()
+            await handler.close()
+
+        asyncio.run(run())
+        self.assertEqual(sent, ["quote"])
+
+    def test_touched_item_is_not_posted_again(self):
+        self.notion = FakeNotion([("item", 1)])
+        sent = []
+
+        async def send(chat_id, item):
+            sent.append((chat_id, item.id))
+            return True
+
+        async def run():
+            handler = self.make_handler()
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1", "2"])])], send)
+            await scheduler.run_cycle()
+            # A property nobody routes on was changed: new edit time, same fingerprint
+            self.notion.pages = [("item", 2)]
+            second = await scheduler.run_cycle()
+            await handler.close()
+            return second
+
+        self.assertEqual(asyncio.run(run()), 0)
+        self.assertEqual(sorted(sent), [("1", "item"), ("2", "item")])
+
+    def test_touched_item_still_reaches_a_failed_target(self):
+        self.notion = FakeNotion([("item", 1)])
+        sent = []
+        failing = {"2"}
+
+        async def send(chat_id, item):
+            sent.append(chat_id)
+            return chat_id not in failing
+
+        async def run():
+            handler = self.make_handler()
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1", "2"])])], send)
+            await scheduler.run_cycle()
+            failing.clear()
+            self.notion.pages = [("item", 2)]
+            await scheduler.run_cycle()
+            third = await scheduler.run_cycle()
+            await handler.close()
+            return third
+
+        self.assertEqual(asyncio.run(run()), 0)
+        self.assertEqual(sorted(sent), ["1", "2", "2"])
+
+    def test_page_failing_every_cycle_stops_holding_the_database(self):
+        self.notion = FakeNotion([("bad", 1), ("good", 2)], broken={"bad"})
+        sent = []
+
+        async def send(chat_id, item):
+            sent.append((item.id, item.content))
+            return True
+
+        async def run():
+            handler = self.make_handler()
+            handler.client.max_retries = 0
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1"])])], send)
+            found = [await scheduler.run_cycle() for _ in range(CONTENT_FAILURE_LIMIT + 1)]
+            await handler.close()
+            return found
+
+        found = asyncio.run(run())
+        # Held before the page while its failure budget lasts, then delivered without a preview
+        self.assertEqual(found, [0] * (CONTENT_FAILURE_LIMIT - 1) + [2, 0])
+        self.assertEqual(sent, [("bad", ""), ("good", "")])
+
+    def test_watermark_waits_for_deliveries(self):
+        async def run():
+            handler = self.make_handler()
+            release = asyncio.Event()
+
+            async def send(chat_id, item):
+                await release.wait()
+                return True
+
+            # Enough slots that every send is in flight while the check itself has finished
+            scheduler = RouteScheduler([DatabaseRoutes(handler, [Route("all", ["1"], max_concurrency=3)])], send)
+            cycle = asyncio.create_task(scheduler.run_cycle())
+            await asyncio.sleep(0.1)
+            during = self.store.get_checkpoint("last_check_time:db")
+            release.set()
+            await cycle
+            await handler.close()
+            return during, self.store.get_checkpoint("last_check_time:db")
+
+        during, after = asyncio.run(run())
+        self.assertEqual(during, "2026-10-18T09:00:00+00:00")
+        self.assertEqual(after, "2026-10-18T10:03:00.000Z")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import html
+import os
+import re
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_chunker import TAG_RE, split_html_message, telegram_length, utf16_length
+
+
+def visible_text(part):
+    return html.unescape(TAG_RE.sub('', part))
+
+
+def open_tag_names(part):
+    # Tags still open at the end of a part; every part must close what it opens
+    stack = []
+    for closing, name, _ in TAG_RE.findall(part):
+        if closing:
+            stack.remove(name)
+        else:
+            stack.append(name)
+    return stack
+
+
+class SplitHtmlMessageTest(unittest.TestCase):
+    def assert_valid_parts(self, parts, limit):
+        for part in parts:
+            self.assertLessEqual(telegram_length(part), limit)
+            self.assertEqual(open_tag_names(part), [])
+
+    def test_short_message_is_untouched(self):
+        text = "<b>Title</b>\nBody &amp; more"
+        self.assertEqual(split_html_message(text, 100), [text])
+
+    def test_words_stay_whole_and_text_is_kept(self):
+        text = " ".join(f"word{index}" for index in range(200))
+        parts = split_html_message(text, 50)
+        self.assertGreater(len(parts), 1)
+        self.assert_valid_parts(parts, 50)
+        self.assertEqual(" ".join(visible_text(part) for part in parts).split(), text.split())
+
+    def test_surrogate_pairs_are_counted_and_never_cut(self):
+        # Each emoji is two UTF-16 code units; an odd limit would cut one in half
+        text = "😀" * 30
+        parts = split_html_message(text, 7)
+        self.assert_valid_parts(parts, 7)
+        for part in parts:
+            self.assertEqual(utf16_length(part), 6)
+            self.assertTrue(all(char == "😀" for char in part))
+        self.assertEqual("".join(parts), text)
+
+    def test_entities_are_never_cut(self):
+        text = "&amp;&lt;&gt;&#39;&#x1F600;" * 20
+        parts = split_html_message(text, 9)
+        self.assert_valid_parts(parts, 9)
+        for part in parts:
+            self.assertIsNone(re.search(r'&[^;]*$', part))
+        self.assertEqual("".join(visible_text(part) for part in parts), visible_text(text))
+
+    def test_word_longer_than_a_message_is_cut_by_characters(self):
+        word = "x" * 25
+        parts = split_html_message(f"before {word} after", 10)
+        self.assert_valid_parts(parts, 10)
+        self.assertEqual("".join(visible_text(part) for part in parts).replace(" ", ""), f"before{word}after")
+        self.assertIn("x" * 10, parts)
+
+    def test_nested_link_is_reopened_in_the_next_part(self):
+        href = '<a href="https://example.com/?a=1&amp;b=2">'
+        text = f"<b>Bold {href}link text that runs on and on</a> tail</b>"
+        parts = split_html_message(text, 12)
+        self.assertGreater(len(parts), 2)
+        self.assert_valid_parts(parts, 12)
+        # Every part inside the link starts by reopening both tags, href included
+        self.assertTrue(parts[1].startswith(f"<b>{href}"))
+        self.assertTrue(parts[1].endswith("</a></b>"))
+        self.assertTrue(parts[-1].startswith("<b>"))
+        self.assertEqual(" ".join(visible_text(part) for part in parts).split(), visible_text(text).split())
+
+    def test_tag_length_does_not_count(self):
+        text = "<b>" + "a" * 10 + "</b>"
+        self.assertEqual(split_html_message(text, 10), [text])
+
+
+if __name__ == "__main__":
+    unittest.main()
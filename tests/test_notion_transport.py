@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from notion_client.errors import HTTPResponseError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from notion_transport import RateLimitedAsyncClient
+
+
+def error(status, headers=None):
+    return httpx.Response(status, headers=headers, json={"object": "error", "status": status, "code": "error", "message": "error"})
+
+
+class FakeNotion:
+    # Answers each request with the next scripted response for its path, then 200
+    def __init__(self, script=None, delay=0.0):
+        self.script = {path: list(responses) for path, responses in (script or {}).items()}
+        self.delay = delay
+        self.calls = []
+
+    async def handle(self, request):
+        path = request.url.path
+        self.calls.append((request.method, path, time.monotonic()))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        responses = self.script.get(path)
+        if responses:
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return httpx.Response(200, json={"object": "page", "id": path.rsplit('/', 1)[-1]})
+
+
+class SendWithRetryTest(unittest.TestCase):
+    def run_client(self, notion, scenario, **options):
+        async def go():
+            http = httpx.AsyncClient(transport=httpx.MockTransport(notion.handle), base_url="https://api.notion.com/v1/")
+            options.setdefault('rate', 1000)
+            options.setdefault('burst', 1000)
+            client = RateLimitedAsyncClient(auth="token", client=http, **options)
+            try:
+                return client, await scenario(client)
+            finally:
+                await http.aclose()
+        return asyncio.run(go())
+
+    def test_429_waits_for_retry_after_and_holds_other_requests(self):
+        notion = FakeNotion({"/v1/pages/a": [error(429, {"Retry-After": "0.2"})]})
+
+        async def scenario(client):
+            first = asyncio.ensure_future(client.pages.retrieve(page_id="a"))
+            await asyncio.sleep(0.05)
+            # Sent while the bucket is blocked, so it waits out the Retry-After too
+            second = await client.pages.retrieve(page_id="b")
+            return await first, second
+
+        client, (first, second) = self.run_client(notion, scenario)
+        self.assertEqual((first["id"], second["id"]), ("a", "b"))
+        started = notion.calls[0][2]
+        retried = [at for method, path, at in notion.calls[1:]]
+        self.assertEqual(len(retried), 2)
+        self.assertTrue(all(at - started >= 0.19 for at in retried))
+        self.assertEqual(client.stats(), {"requests": 3, "retries": 1, "rate_limited": 1, "coalesced": 0})
+
+    def test_server_errors_are_retried_with_jittered_backoff(self):
+        notion = FakeNotion({"/v1/pages/a": [error(502), error(503), httpx.ConnectError("reset"), error(500)]})
+        bounds = []
+
+        def uniform(low, high):
+            bounds.append((low, high))
+            return 0.0
+
+        async def scenario(client):
+            return await client.pages.retrieve(page_id="a")
+
+        with mock.patch('notion_transport.random.uniform', side_effect=uniform):
+            client, page = self.run_client(notion, scenario, backoff_base=0.5, backoff_cap=3.0)
+        self.assertEqual(page["id"], "a")
+        self.assertEqual(len(notion.calls), 5)
+        # Full jitter: each delay is drawn from [0, min(cap, base * 2 ** attempt)]
+        self.assertEqual(bounds, [(0, 0.5), (0, 1.0), (0, 2.0), (0, 3.0)])
+        self.assertEqual(client.stats()["retries"], 4)
+        self.assertEqual(client.stats()["rate_limited"], 0)
+
+    def test_server_retry_after_is_honoured_without_jitter(self):
+        notion = FakeNotion({"/v1/pages/a": [error(503, {"Retry-After": "0.1"})]})
+
+        async def scenario(client):
+            return await client.pages.retrieve(page_id="a")
+
+        with mock.patch('notion_transport.random.uniform') as uniform:
+            self.run_client(notion, scenario)
+        uniform.assert_not_called()
+        self.assertGreaterEqual(notion.calls[1][2] - notion.calls[0][2], 0.09)
+
+    def test_gives_up_after_max_retries(self):
+        notion = FakeNotion({"/v1/pages/a": [error(502)] * 10})
+
+        async def scenario(client):
+            return await client.pages.retrieve(page_id="a")
+
+        with mock.patch('notion_transport.random.uniform', return_value=0.0):
+            with self.assertRaises(HTTPResponseError) as raised:
+                self.run_client(notion, scenario, max_retries=2)
+        self.assertEqual(raised.exception.status, 502)
+        self.assertEqual(len(notion.calls), 3)
+
+    def test_client_errors_are_not_retried(self):
+        notion = FakeNotion({"/v1/pages/a": [error(400)]})
+
+        async def scenario(client):
+            return await client.pages.retrieve(page_id="a")
+
+        with self.assertRaises(HTTPResponseError):
+            self.run_client(notion, scenario)
+        self.assertEqual(len(notion.calls), 1)
+
+    def test_identical_reads_in_flight_share_one_request(self):
+        notion = FakeNotion(delay=0.05)
+
+        async def scenario(client):
+            reads = await asyncio.gather(*(client.pages.retrieve(page_id="a") for _ in range(5)))
+            other = await client.pages.retrieve(page_id="b")
+            return reads, other
+
+        client, (reads, other) = self.run_client(notion, scenario)
+        self.assertEqual([path for _, path, _ in notion.calls], ["/v1/pages/a", "/v1/pages/b"])
+        self.assertEqual(client.stats()["coalesced"], 4)
+        # Every caller gets its own copy to mutate
+        reads[1]["id"] = "changed"
+        self.assertEqual([read["id"] for read in reads], ["a", "changed", "a", "a", "a"])
+
+    def test_coalesced_readers_share_the_retries(self):
+        notion = FakeNotion({"/v1/pages/a": [error(502)]}, delay=0.02)
+
+        async def scenario(client):
+            return await asyncio.gather(*(client.pages.retrieve(page_id="a") for _ in range(3)))
+
+        with mock.patch('notion_transport.random.uniform', return_value=0.0):
+            client, reads = self.run_client(notion, scenario)
+        self.assertEqual([read["id"] for read in reads], ["a"] * 3)
+        self.assertEqual(len(notion.calls), 2)
+
+    def test_writes_are_never_coalesced(self):
+        notion = FakeNotion(delay=0.02)
+
+        async def scenario(client):
+            return await asyncio.gather(*(client.pages.update(page_id="a", properties={}) for _ in range(3)))
+
+        client, _ = self.run_client(notion, scenario)
+        self.assertEqual([method for method, _, _ in notion.calls], ["PATCH"] * 3)
+        self.assertEqual(client.stats()["coalesced"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from page_record import PageRecord
+from search_index import PRESELECT, SearchIndex
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa", "lambda", "sigma"]
+
+
+def make_page(rng, page_id, version):
+    # "common" is in every page so its ranking is large enough to be kept in order
+    body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30)))
+    return PageRecord(
+        id=page_id,
+        url=f"https://notion.so/{page_id}",
+        title=f"{rng.choice(WORDS)} note",
+        status="Done",
+        last_edited_time=f"2026-10-18T10:00:{version:02d}.000Z",
+        content=f"<p>common {body}</p>",
+    )
+
+
+class SearchIndexTest(unittest.TestCase):
+    def assert_rankings_consistent(self, index):
+        self.assertTrue(index.rankings)
+        for term, ranking in index.rankings.items():
+            posting = index.postings[term]
+            self.assertEqual(sorted(ranking), sorted(posting), term)
+            impacts = [posting[number] for number in ranking]
+            self.assertEqual(impacts, sorted(impacts, reverse=True), term)
+
+    def fill(self, index, rng):
+        for number in range(PRESELECT * 2):
+            index.put(make_page(rng, f"p{number}", 0))
+        return {f"p{number}": 0 for number in range(PRESELECT * 2)}
+
+    def churn(self, index, rng, versions, rounds):
+        for step in range(rounds):
+            page_id = f"p{rng.randrange(PRESELECT * 2)}"
+            if page_id in versions and rng.random() < 0.3:
+                index.remove(page_id)
+                del versions[page_id]
+            else:
+                versions[page_id] = versions.get(page_id, 0) + 1
+                index.put(make_page(rng, page_id, versions[page_id] % 60))
+            if step % 50 == 0:
+                # Searching builds rankings for the terms it touches
+                index.search(rng.choice(WORDS))
+                index.search("common " + rng.choice(WORDS))
+
+    def test_rankings_stay_ordered_through_put_replace_and_remove(self):
+        rng = random.Random(7)
+        index = SearchIndex()
+        versions = self.fill(index, rng)
+        index.search("common")
+        self.churn(index, rng, versions, 3000)
+        self.assert_rankings_consistent(index)
+        self.assertEqual(len(index), len(versions))
+        # Removed pages never come back from a search
+        for page in index.search("common", limit=len(versions) + 10):
+            self.assertIn(page.page_id, versions)
+
+    def test_replaced_page_is_found_by_its_new_words_only(self):
+        index = SearchIndex()
+        first = PageRecord(id="p1", url="u", title="Old title", status="Done",
+                           last_edited_time="2026-10-18T10:00:00.000Z", content="obsolete words")
+        index.put(first)
+        index.put(PageRecord(id="p1", url="u", title="New title", status="Done",
+                             last_edited_time="2026-10-18T11:00:00.000Z", content="fresh words"))
+        self.assertEqual([page.page_id for page in index.search("fresh")], ["p1"])
+        self.assertEqual(index.search("obsolete"), [])
+        self.assertEqual(index.stats(), {"pages": 1, "terms": 4})
+        index.remove("p1")
+        self.assertEqual(index.search("words"), [])
+        self.assertEqual(index.stats(), {"pages": 0, "terms": 0})
+
+    def test_reload_from_disk_keeps_pages_and_rankings(self):
+        rng = random.Random(11)
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "search.db")
+            index = SearchIndex(path)
+            versions = self.fill(index, rng)
+            self.churn(index, rng, versions, 500)
+            index.close()
+
+            reloaded = SearchIndex(path)
+            try:
+                self.assertEqual(len(reloaded), len(versions))
+                # Common terms are ranked on load
+                self.assertIn("common", reloaded.rankings)
+                self.assert_rankings_consistent(reloaded)
+                found = {page.page_id for page in reloaded.search("common", limit=len(versions))}
+                self.assertEqual(found, set(versions))
+            finally:
+                reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
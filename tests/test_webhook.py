@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fake_servers import FakeBotAPI, FakeNotion, ServerOptions
+
+SECRET = "webhook-test-secret"
+UPDATE = {"update_id": 1, "message": {
+    "message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hello",
+}}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class WebhookTest(unittest.TestCase):
+    # Runs main.py in webhook mode against the fake Bot API, which answers setWebhook
+    def test_only_updates_signed_with_the_secret_are_accepted(self):
+        asyncio.run(self.run_bot())
+
+    async def run_bot(self):
+        logging.getLogger('tornado.access').setLevel(logging.ERROR)
+        notion = FakeNotion(ServerOptions(0.0))
+        bot_api = FakeBotAPI(ServerOptions(0.0))
+        notion_url = notion.start()
+        bot_url = bot_api.start()
+        port = free_port()
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                NOTION_TOKEN="test",
+                NOTION_DATABASE_ID=notion.add_database(0),
+                NOTION_API_BASE_URL=notion_url,
+                TELEGRAM_BOT_TOKEN="123456:test",
+                TELEGRAM_CHAT_ID="1000",
+                TELEGRAM_API_BASE_URL=bot_url,
+                STATE_DB_PATH=os.path.join(workdir, "state.db"),
+                LOG_FILE=os.path.join(workdir, "bot.log"),
+                ROUTES_FILE="",
+                METRICS_PORT="0",
+                CHECK_INTERVAL="300",
+                WEBHOOK_URL="https://bot.example.com",
+                WEBHOOK_LISTEN="127.0.0.1",
+                WEBHOOK_PORT=str(port),
+                WEBHOOK_SECRET=SECRET,
+            )
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(ROOT, "main.py"),
+                cwd=workdir, env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                deadline = time.monotonic() + 20
+                while not bot_api.calls.get("setWebhook"):
+                    self.assertIsNone(process.returncode, "main.py exited before registering the webhook")
+                    self.assertLess(time.monotonic(), deadline, "setWebhook was never called")
+                    await asyncio.sleep(0.05)
+
+                url = f"http://127.0.0.1:{port}/telegram"
+                async with httpx.AsyncClient() as client:
+                    for _ in range(100):
+                        try:
+                            wrong = await client.post(url, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+                            break
+                        except httpx.ConnectError:
+                            await asyncio.sleep(0.05)
+                    missing = await client.post(url, json=UPDATE)
+                    right = await client.post(url, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                self.assertEqual(wrong.status_code, 403)
+                self.assertEqual(missing.status_code, 403)
+                self.assertEqual(right.status_code, 200)
+            finally:
+                if process.returncode is None:
+                    process.send_signal(signal.SIGTERM)
+                    try:
+                        await asyncio.wait_for(process.wait(), 20)
+                    except asyncio.TimeoutError:
+                        process.kill()
+                        await process.wait()
+                notion.stop()
+                bot_api.stop()
+        self.assertEqual(process.returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()